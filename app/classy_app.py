@@ -5,29 +5,40 @@ import numpy as np
 import holoviews as hv
 from holoviews import opts
 
+hv.extension('bokeh')
 
-# Read in data
-params_with_latex = loaders.load_params('../data/chains_planckbossdes_1MeV/2022-11-16_3200000_.paramnames')
-param_names = list(params_with_latex.keys())
-chains = loaders.load_chains('../data/chains_planckbossdes_1MeV/*.txt', param_names, params_only=True)
-# downsample to avoid overplotting
-chains = chains.sample(n=500, random_state=1).reset_index(drop=True)
-
-# prepare data for CLASS computation
-# remove nuisance parameters
-classy_input = chains.loc[:, ('omega_b', 'omega_cdm', 'ln10^{10}A_s', 'n_s', 'tau_reio', 'sigma_dmeff', 'Omega_Lambda', 'YHe', 'H0')]
-classy_input['omega_b'] = classy_input['omega_b'] * 1e-2
-classy_input['sigma_dmeff'] = classy_input['sigma_dmeff'] * 1e-25
-classy_input = classy_input.rename(columns={'H0':'h'})
-classy_input['h'] = classy_input['h'] * 1e-2
-classy_input['f_dmeff'] = 0.1
-classy_input['npow_dmeff'] = 0.0
-classy_input['Vrel_dmeff'] = 0.0
-classy_input['dmeff_target'] = 'baryons'
-classy_input['m_dmeff'] = 1e-3
-
-# format for CDM version
-classy_CDM = classy_input.drop(columns=['sigma_dmeff', 'npow_dmeff', 'Vrel_dmeff', 'dmeff_target', 'm_dmeff'])
+
+# Read in data and prepare the inputs of CLASS, once per server process and again when the chains change
+def load_data(paramnames, pattern):
+    params_with_latex = loaders.load_params(paramnames)
+    param_names = list(params_with_latex.keys())
+    chains = loaders.load_chains(pattern, param_names, params_only=False)
+    # downsample to avoid overplotting, drawing by sample weight and keeping the best fit
+    chains = loaders.subsample(chains, n=500, keep_best=1, random_state=1)
+    chains = chains.drop(columns=['weight', '-LogLkl']).reset_index(drop=True)
+
+    # prepare data for CLASS computation
+    # remove nuisance parameters
+    classy_input = chains.loc[:, ('omega_b', 'omega_cdm', 'ln10^{10}A_s', 'n_s', 'tau_reio', 'sigma_dmeff', 'Omega_Lambda', 'YHe', 'H0')]
+    classy_input['omega_b'] = classy_input['omega_b'] * 1e-2
+    classy_input['sigma_dmeff'] = classy_input['sigma_dmeff'] * 1e-25
+    classy_input = classy_input.rename(columns={'H0':'h'})
+    classy_input['h'] = classy_input['h'] * 1e-2
+    classy_input['f_dmeff'] = 0.1
+    classy_input['npow_dmeff'] = 0.0
+    classy_input['Vrel_dmeff'] = 0.0
+    classy_input['dmeff_target'] = 'baryons'
+    classy_input['m_dmeff'] = 1e-3
+
+    # format for CDM version
+    classy_CDM = classy_input.drop(columns=['sigma_dmeff', 'npow_dmeff', 'Vrel_dmeff', 'dmeff_target', 'm_dmeff'])
+    return params_with_latex, chains, classy_input, classy_CDM
+
+
+params_with_latex, chains, classy_input, classy_CDM = bsv.shared(
+    'classy_data', load_data,
+    '../data/chains_planckbossdes_1MeV/2022-11-16_3200000_.paramnames', '../data/chains_planckbossdes_1MeV/*.txt'
+)
 
 cosmo_copts = opts.Curve(
     logx=True, 
@@ -45,10 +56,15 @@ resids_latex = {
 residuals = bsv.LiveObservable(
     name=['P(k) Residuals', 'Cl_TT Residuals', 'Cl_EE Residuals'], 
     myfunc=cosmo.compute_residuals,
-    myfunc_args=(classy_input, classy_CDM), 
+    # two selected samples at a time, each running CLASS on the model and on its LCDM baseline
+    myfunc_args=(classy_input, classy_CDM, 4),
+    executor='thread',
+    max_workers=2,
     plot_type='Curve',
     plot_opts=cosmo_copts,
-    latex_labels=resids_latex
+    latex_labels=resids_latex,
+    # results computed for one session are reused by every other session and process
+    cache=bsv.default_registry.result_cache('residuals')
 )
 
 bsv.viz(data=chains, observables=[residuals], latex_dict=params_with_latex).servable('Fractional IDM')
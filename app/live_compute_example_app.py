@@ -4,6 +4,8 @@ from holoviews import opts
 import numpy as np
 import pandas as pd
 
+hv.extension('bokeh')
+
 # Set up the parameters of the problem.
 ndim, nsamples = 3, 1000
 
@@ -4,6 +4,8 @@ import bsavi as bsv
 import holoviews as hv
 from holoviews import opts
 
+hv.extension('bokeh')
+
 like = pd.DataFrame(np.random.rand(100, 4), columns=list('ABCD'))
 like_latex = {'A': r'\alpha',
               'B': r'\beta',
@@ -1,8 +1,11 @@
 import pandas as pd
+import holoviews as hv
 from holoviews import opts
 import bsavi as bsv
 from bsavi.loaders import load_params
 
+hv.extension('bokeh')
+
 mycosmo = pd.read_json('../data/planck2018/power_spectra_small.json')
 chains = mycosmo.drop(columns=['p(k)', 'cl_tt', 'cl_ee'])
 class_results = mycosmo[['p(k)', 'cl_tt', 'cl_ee']]
@@ -3,10 +3,9 @@ import pandas as pd
 import holoviews as hv
 from holoviews import opts
 
+hv.extension('bokeh')
+
 
-binned_df = pd.read_pickle('../data/trey_uvlf/bouwens_2023_data_binned.pkl')
-params_df = binned_df[['alphaOutflow', 'alphaStar', 'like', 'timescale', 'velocityOutflow']]
-lumfunc_df = binned_df[['uvlf_Muv', 'uvlf_z10.5', 'uvlf_z12.6', 'uvlf_z8.7']]
 lumfunc_latex = {
     'alphaOutflow': r'\alpha_{Outflow}',
     'alphaStar': r'\alpha_{Star}',
@@ -22,21 +21,32 @@ uvlf_latex = {
     'uvlf_z12.6': r'\text{Luminosity Function}',
     'uvlf_z8.7': r'\text{Luminosity Function}',
 }
-uvlf_observables = bsv.Observable(
-    name=[
-        'UVLF at z = 10.5', 
-        'UVLF at z = 12.6', 
-        'UVLF at z = 8.7'
-    ], 
-    data=[
-        lumfunc_df[['uvlf_Muv', 'uvlf_z10.5']], 
-        lumfunc_df[['uvlf_Muv', 'uvlf_z12.6']], 
-        lumfunc_df[['uvlf_Muv', 'uvlf_z8.7']], 
-    ], 
-    plot_type='Curve',
-    plot_opts=curve_opts,
-    latex_labels=uvlf_latex
-)
+
+
+def load_uvlf(path):
+    binned_df = pd.read_pickle(path)
+    params_df = binned_df[['alphaOutflow', 'alphaStar', 'like', 'timescale', 'velocityOutflow']]
+    lumfunc_df = binned_df[['uvlf_Muv', 'uvlf_z10.5', 'uvlf_z12.6', 'uvlf_z8.7']]
+    uvlf_observables = bsv.Observable(
+        name=[
+            'UVLF at z = 10.5', 
+            'UVLF at z = 12.6', 
+            'UVLF at z = 8.7'
+        ], 
+        data=[
+            lumfunc_df[['uvlf_Muv', 'uvlf_z10.5']], 
+            lumfunc_df[['uvlf_Muv', 'uvlf_z12.6']], 
+            lumfunc_df[['uvlf_Muv', 'uvlf_z8.7']], 
+        ], 
+        plot_type='Curve',
+        plot_opts=curve_opts,
+        latex_labels=uvlf_latex
+    )
+    return params_df, uvlf_observables
+
+
+# read once per server process and shared by every session, and again when the file changes
+params_df, uvlf_observables = bsv.shared('uvlf', load_uvlf, '../data/trey_uvlf/bouwens_2023_data_binned.pkl')
 
 bsv.viz(params_df, [uvlf_observables], latex_dict=lumfunc_latex).servable('JWST UVLF')
 
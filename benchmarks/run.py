@@ -0,0 +1,318 @@
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import holoviews as hv
+from bokeh.document import Document
+from bokeh.protocol import Protocol
+import bsavi as bsv
+from bsavi.loaders import load_chains, ChainDataset
+from bsavi.crossfilter import CrossFilter
+import synthetic
+
+# benchmarks of the load -> select -> compute -> render pipeline on synthetic chains.
+#   python benchmarks/run.py                         run and save benchmarks/results/<commit>.json
+#   python benchmarks/run.py --sizes 1e4 1e7         choose the numbers of rows
+#   python benchmarks/run.py compare OLD.json NEW.json
+#   python benchmarks/run.py imports --budget 1.0
+# every result is a record of the benchmark name, its parameters and the measured values,
+# so that two results files can be matched record by record
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# how the observables of the selected samples are drawn, as arguments of viz
+_modes = {
+    'overlay': {},
+    'multiline': {'multiline': True},
+    'bands': {'bands': True},
+    'incremental': {'incremental': True},
+}
+
+# modules that must be importable without the visualization stack, and the stack itself
+_light_modules = ['bsavi', 'bsavi.loaders', 'bsavi.stats', 'bsavi.cache', 'from bsavi import loaders']
+_heavy_modules = ('holoviews', 'panel', 'bokeh')
+# scripts reading chains next to their own HoloViews plots must not bring in panel and bokeh either.
+# the time of these imports is mostly HoloViews', so it isn't held to the budget
+_with_holoviews = 'bsavi.loaders, holoviews'
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=_HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _timings(func, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'seconds': float(np.median(times)), 'min_seconds': float(np.min(times)), 'repeats': len(times)}
+
+
+# size in bytes of the message the server would send for the given document changes
+def _patch_bytes(events):
+    if not events:
+        return 0
+    message = Protocol().create('PATCH-DOC', events)
+    buffers = sum(len(buffer[1]) if isinstance(buffer, tuple) else len(buffer) for buffer in message.buffers)
+    return len(message.header_json) + len(message.metadata_json) + len(message.content_json) + buffers
+
+
+# viz keeps its selection stream to itself: a Selection1D, or a plain stream of the same
+# contents with rasterize=True
+def _selection_streams():
+    return [obj for obj in gc.get_objects() if isinstance(obj, hv.streams.Stream) and list(obj.contents) == ['index']]
+
+
+# the dashboard rendered into a document, as panel serve would, with its selection stream
+class _Session:
+    def __init__(self, samples, observables, **kwargs):
+        known = {id(stream) for stream in _selection_streams()}
+        start = time.perf_counter()
+        dashboard = bsv.viz(samples, observables, **kwargs)
+        self.doc = Document()
+        self.doc.add_root(dashboard.get_root(self.doc))
+        self.seconds = time.perf_counter() - start
+        self.selection = [stream for stream in _selection_streams() if id(stream) not in known][0]
+        self.events = []
+        self.doc.on_change(self.events.append)
+
+    def document_bytes(self):
+        return len(json.dumps(self.doc.to_json()))
+
+    def select(self, index):
+        self.events.clear()
+        start = time.perf_counter()
+        self.selection.event(index=list(index))
+        return time.perf_counter() - start, _patch_bytes(self.events)
+
+
+# time to import modules, or run a from-import, in a fresh interpreter, as modules are only imported once per process,
+# and which of the heavy modules they brought in
+def _import(module):
+    statement = module if module.startswith('from ') else f'import {module}'
+    code = (f'import sys, time\nstart = time.perf_counter()\n{statement}\n'
+            f'print(time.perf_counter() - start, *[m for m in {_heavy_modules!r} if m in sys.modules])')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), output[1:]
+
+
+def bench_import(args):
+    records = []
+    for module in _light_modules + [_with_holoviews, 'bsavi.bsavi']:
+        times = []
+        for _ in range(args.repeats):
+            seconds, heavy = _import(module)
+            times.append(seconds)
+        records.append({'name': 'import', 'rows': 0, 'params': {'module': module},
+                        'seconds': float(np.median(times)), 'min_seconds': float(np.min(times)),
+                        'repeats': len(times), 'heavy': heavy})
+    return records
+
+
+def bench_load(rows, args, workdir):
+    pattern, paramnames, names = synthetic.write_chains(workdir, rows, args.params, args.files)
+    records = []
+    variants = [
+        ('load_chains', {}),
+        ('load_chains', {'parallel': True}),
+        ('load_chains', {'columns': names[:2], 'thin': 2}),
+    ]
+    for name, kwargs in variants:
+        timing = _timings(lambda: load_chains(pattern, names, **kwargs), args.repeats)
+        records.append({'name': name, 'rows': rows, 'params': kwargs, **timing})
+    with tempfile.TemporaryDirectory(dir=workdir) as cache_dir:
+        cold = _timings(lambda: ChainDataset(pattern, names, cache_dir), 1)
+        warm = _timings(lambda: ChainDataset(pattern, names, cache_dir), args.repeats)
+    records.append({'name': 'ChainDataset', 'rows': rows, 'params': {'cache': 'cold'}, **cold})
+    records.append({'name': 'ChainDataset', 'rows': rows, 'params': {'cache': 'warm'}, **warm})
+    return records
+
+
+def bench_crossfilter(rows, args):
+    samples = synthetic.make_samples(rows, args.params)
+    columns = list(samples.columns)
+    engine = CrossFilter(samples)
+    records = [{'name': 'crossfilter', 'rows': rows, 'params': {'step': 'index columns'},
+                **_timings(lambda: [engine.filter(column, (-1, 1)) for column in columns], 1)}]
+    rng = np.random.default_rng(2)
+    def brush():
+        low = rng.uniform(-1.5, 0.5)
+        engine.filter(columns[0], (low, low + 1))
+        engine.filter(columns[1], (low, low + 1))
+    records.append({'name': 'crossfilter', 'rows': rows, 'params': {'step': 'brush'}, **_timings(brush, args.repeats)})
+    records.append({'name': 'crossfilter', 'rows': rows, 'params': {'step': 'index'},
+                    **_timings(lambda: engine.index(exclude=columns[:2]), args.repeats)})
+    return records
+
+
+def bench_viz(rows, args):
+    samples = synthetic.make_samples(rows, args.params)
+    rasterize = rows > args.rasterize_above
+    records = []
+
+    sessions = [_Session(samples, None, rasterize=rasterize) for _ in range(args.repeats)]
+    records.append({
+        'name': 'viz', 'rows': rows, 'params': {'rasterize': rasterize},
+        'seconds': float(np.median([session.seconds for session in sessions])),
+        'min_seconds': float(np.min([session.seconds for session in sessions])),
+        'repeats': len(sessions), 'bytes': sessions[0].document_bytes()
+    })
+
+    rng = np.random.default_rng(1)
+    observables = {
+        'Observable': lambda: synthetic.curve_observable(samples, args.points),
+        'LiveObservable': lambda: synthetic.live_observable(samples, args.points),
+    }
+    for (kind, make), mode in itertools.product(observables.items(), args.modes):
+        session = _Session(samples, [make()], rasterize=rasterize, **_modes[mode])
+        for count in args.selections:
+            times = []
+            sizes = []
+            for _ in range(args.repeats):
+                # a new set of samples every time, so cached plots don't hide the computation
+                seconds, size = session.select(rng.choice(rows, count, replace=False))
+                times.append(seconds)
+                sizes.append(size)
+            records.append({
+                'name': 'select', 'rows': rows, 'params': {'observable': kind, 'mode': mode, 'selected': count, 'rasterize': rasterize},
+                'seconds': float(np.median(times)), 'min_seconds': float(np.min(times)),
+                'repeats': len(times), 'bytes': int(np.median(sizes))
+            })
+    return records
+
+
+def run(args):
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), 'bsavi-benchmarks')
+    records = bench_import(args)
+    for rows in args.sizes:
+        print(f'{rows} rows: loading', flush=True)
+        records += bench_load(rows, args, workdir)
+        records += bench_crossfilter(rows, args)
+        if rows <= args.max_viz_rows:
+            print(f'{rows} rows: viz and selections', flush=True)
+            records += bench_viz(rows, args)
+    results = {
+        'commit': _commit(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'arguments': {key: value for key, value in vars(args).items() if key not in ('command', 'output', 'workdir')},
+        'results': records,
+    }
+    output = args.output or os.path.join(_HERE, 'results', f'{results["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    _print(records)
+    print(f'saved {output}')
+
+
+def _key(record):
+    return (record['name'], record['rows'], json.dumps(record['params'], sort_keys=True))
+
+
+def _print(records):
+    for record in records:
+        size = f"{record['bytes']:>12d} B" if 'bytes' in record else ''
+        print(f"{record['name']:<14}{record['rows']:>10d}  {json.dumps(record['params']):<80}"
+              f"{1e3 * record['seconds']:>10.1f} ms {size}")
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    before = {_key(record): record for record in old['results']}
+    print(f"{old['commit']} -> {new['commit']}")
+    regressions = 0
+    for record in new['results']:
+        previous = before.get(_key(record))
+        if previous is None:
+            continue
+        ratio = record['seconds'] / previous['seconds']
+        flag = ''
+        if ratio > 1 + args.threshold:
+            flag = '  slower'
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = '  faster'
+        size = ''
+        if 'bytes' in record and 'bytes' in previous:
+            size = f"  {previous['bytes']:>10d} -> {record['bytes']:>10d} B"
+        print(f"{record['name']:<14}{record['rows']:>10d}  {json.dumps(record['params']):<80}"
+              f"{1e3 * previous['seconds']:>10.1f} -> {1e3 * record['seconds']:>10.1f} ms  x{ratio:.2f}{size}{flag}")
+    return 1 if regressions else 0
+
+
+# fails when a light module takes longer than the budget to import, or imports the visualization stack
+def imports(args):
+    failures = 0
+    for record in bench_import(args):
+        module = record['params']['module']
+        flag = ''
+        if module in _light_modules:
+            if record['heavy']:
+                flag = f"  imports {', '.join(record['heavy'])}"
+            elif record['seconds'] > args.budget:
+                flag = f'  over the budget of {1e3 * args.budget:.0f} ms'
+        elif module == _with_holoviews:
+            heavy = [name for name in record['heavy'] if name != 'holoviews']
+            if heavy:
+                flag = f"  imports {', '.join(heavy)}"
+        failures += bool(flag)
+        print(f"{module:<28}{1e3 * record['seconds']:>10.1f} ms{flag}")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of bsavi on synthetic chains.')
+    commands = parser.add_subparsers(dest='command')
+    compare_parser = commands.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='relative change in time reported as slower or faster')
+    imports_parser = commands.add_parser('imports', help='check the import time of the modules that do not need the dashboard')
+    imports_parser.add_argument('--budget', type=float, default=1.0, help='seconds any of them may take to import')
+    imports_parser.add_argument('--repeats', type=int, default=3, help='repetitions of each measurement')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1e4, 1e5, 1e6], help='numbers of rows')
+    parser.add_argument('--params', type=int, default=6, help='number of parameters of the chains')
+    parser.add_argument('--files', type=int, default=4, help='number of chain files')
+    parser.add_argument('--points', type=int, default=100, help='number of points of each observable curve')
+    parser.add_argument('--selections', type=int, nargs='+', default=[1, 10, 100], help='numbers of selected samples')
+    parser.add_argument('--modes', nargs='+', default=list(_modes), choices=list(_modes),
+                        help='ways of drawing the observables of the selection')
+    parser.add_argument('--repeats', type=int, default=3, help='repetitions of each measurement')
+    parser.add_argument('--max-viz-rows', type=float, default=1e5,
+                        help='largest number of rows the dashboard is benchmarked on (observables are held in memory)')
+    parser.add_argument('--rasterize-above', type=float, default=1e5, help='rasterize the samples above this many rows')
+    parser.add_argument('--workdir', help='directory of the synthetic chains, reused between runs')
+    parser.add_argument('--output', help='results file. benchmarks/results/<commit>.json by default')
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return compare(args)
+    if args.command == 'imports':
+        return imports(args)
+    args.sizes = [int(size) for size in args.sizes]
+    run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
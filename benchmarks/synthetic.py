@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import pandas as pd
+import bsavi as bsv
+
+# synthetic chains and observables for the benchmarks, so that no CLASS run or real chain is needed
+
+
+def make_params(count):
+    return [f'p{i}' for i in range(count)]
+
+
+# correlated gaussian samples with MontePython-like weights and likelihoods
+def make_chain(rows, params=6, seed=0):
+    rng = np.random.default_rng(seed)
+    mixing = rng.normal(size=(params, params)) / np.sqrt(params)
+    values = rng.normal(size=(rows, params)) @ mixing + rng.uniform(-1, 1, params)
+    weight = rng.geometric(0.4, rows).astype(float)
+    loglkl = 0.5 * np.sum(values**2, axis=1) + 1000.0
+    return np.column_stack([weight, loglkl, values])
+
+
+def write_chains(directory, rows, params=6, files=4, seed=0, blocksize=1 << 18):
+    """
+    Write `rows` samples split over `files` chain files in the MontePython text format,
+    and the matching .paramnames file. Files already written for the same arguments are
+    reused. Returns the glob pattern of the chains, the .paramnames file and the names.
+    """
+    os.makedirs(directory, exist_ok=True)
+    names = make_params(params)
+    prefix = os.path.join(directory, f'synthetic_{rows}_{params}_{seed}')
+    paramnames = f'{prefix}_.paramnames'
+    with open(paramnames, 'w') as f:
+        for name in names:
+            f.write(f'{name} \t {name.replace("p", "p_{")}}}\n')
+    bounds = np.linspace(0, rows, files + 1).astype(int)
+    for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        filename = f'{prefix}__{i + 1}.txt'
+        if os.path.exists(filename):
+            continue
+        with open(f'{filename}.tmp', 'w') as f:
+            for block in range(start, stop, blocksize):
+                chain = make_chain(min(blocksize, stop - block), params, seed=(seed, i, block))
+                np.savetxt(f, chain, fmt=['%d', '%.2f'] + ['%.6e'] * params, delimiter='\t')
+        os.replace(f'{filename}.tmp', filename)
+    return f'{prefix}__*.txt', paramnames, names
+
+
+def make_samples(rows, params=6, seed=0):
+    """The samples of write_chains as an in-memory DataFrame of the parameters."""
+    return pd.DataFrame(make_chain(rows, params, seed)[:, 2:], columns=make_params(params))
+
+
+def curve_observable(samples, points=200):
+    """A tabulated Observable of one curve per sample on a shared grid."""
+    x = np.linspace(0.1, 10, points)
+    a = samples.iloc[:, 0].to_numpy()[:, None]
+    b = samples.iloc[:, 1].to_numpy()[:, None]
+    y = np.exp(0.1 * a * np.log(x)) * np.sin(x + b)
+    data = pd.DataFrame({'x': [x] * len(samples), 'y': list(y)})
+    return bsv.Observable(name='tabulated', data=[data], plot_type=['Curve'])
+
+
+def waves(index, samples, x):
+    a, b = samples.iloc[index, 0], samples.iloc[index, 1]
+    return [{'x': x, 'y': np.exp(0.1 * a * np.log(x)) * np.sin(x + b)}]
+
+
+def live_observable(samples, points=200):
+    """A LiveObservable computing the curves of curve_observable on demand."""
+    x = np.linspace(0.1, 10, points)
+    return bsv.LiveObservable(name='live', myfunc=waves, myfunc_args=(samples, x), plot_type=['Curve'])
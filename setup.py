@@ -30,6 +30,8 @@ setuptools.setup(
                       "dask<=2023.5.0", # python 3.8 compatibility
                       "param==1.13.0",
                       "numpy>=1.21, <=1.24",
-                      "matplotlib==3.7.1"]
+                      "matplotlib==3.7.1"],
+    extras_require={"rasterize": ["datashader"]},
+    entry_points={"console_scripts": ["bsavi-precompute=bsavi.precompute:main"]}
     )
 
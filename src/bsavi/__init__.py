@@ -1 +1,45 @@
-from .bsavi import *
\ No newline at end of file
+import importlib
+import pkgutil
+from threading import Lock
+
+# the names of bsavi.bsavi are imported on first access, so that importing bsavi.loaders or
+# bsavi.cosmo, also as from bsavi import loaders, doesn't import holoviews, panel and bokeh
+_submodules = {module.name for module in pkgutil.iter_modules(__path__)}
+
+
+def _viz():
+    return importlib.import_module('.bsavi', __name__)
+
+
+def __getattr__(name):
+    if name == '__all__':
+        return [name for name in vars(_viz()) if not name.startswith('_')]
+    if name.startswith('__'):
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+    try:
+        value = getattr(_viz(), name)
+    except AttributeError:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'") from None
+    _load_extensions()
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__getattr__('__all__')))
+
+
+# the plotting backend and the MathJax extensions are loaded with the first name of bsavi.bsavi
+# rather than on import, so that scripts only reading chains don't pay for them. scripts that
+# build HoloViews options before that call hv.extension themselves
+_extensions = {'loaded': False, 'lock': Lock()}
+def _load_extensions():
+    with _extensions['lock']:
+        if not _extensions['loaded']:
+            import holoviews as hv
+            import panel as pn
+            hv.extension('bokeh', enable_mathjax=True)
+            pn.extension('mathjax')
+            _extensions['loaded'] = True
+
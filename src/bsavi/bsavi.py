@@ -1,14 +1,31 @@
 import holoviews as hv
 from holoviews import dim, opts, streams
 import pandas as pd
+import time
+import logging
+import warnings
 import numpy as np
 import panel as pn
 # import spatialpandas
 from bokeh.models import HoverTool
+from bokeh.protocol import Protocol
 from typing import List, Callable, Union
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from threading import Thread
+from . import _load_extensions
+from .selection import SpatialIndex
+from .cache import PlotCache, DiskCache, result_key
+from .precompute import load_store, _plot_types, _init_worker, _call_worker
+from .stats import weighted_quantiles, weighted_histogram, weighted_density_2d, credible_levels
+from .loaders.subsample import _column_values
+from .loaders.follow import ChainFollower
+from .incremental import IncrementalCurves
+from .table import SelectionTable
+from .crossfilter import CrossFilter, ScatterMatrix
+from .metrics import Metrics, serve_metrics, metrics_text, MetricsHandler
+from .registry import SharedRegistry, default_registry, shared
 
-hv.extension('bokeh', enable_mathjax=True)
-pn.extension('mathjax')
+logger = logging.getLogger('bsavi')
 
 
 # unpacks the nested data. handles the two supported datatypes
@@ -22,6 +39,49 @@ def _unpacker(dataset, index):
     return unpacked_data
 
 
+# store one dataset of an Observable as column name -> 2D array with one row per sample, so the
+# data at an index is a view. a column that is the same for every sample is broadcast from a
+# single row, and columns whose rows differ in length stay lists of arrays
+def _as_arrays(dataset):
+    if isinstance(dataset, pd.core.frame.DataFrame):
+        dataset = {column: dataset[column].tolist() for column in dataset.columns}
+    arrays = {}
+    for column, rows in dataset.items():
+        if isinstance(rows, np.ndarray) and rows.ndim == 2:
+            arrays[column] = rows
+            continue
+        rows = [np.asarray(row) for row in rows]
+        if not rows or rows[0].ndim != 1 or any(row.shape != rows[0].shape for row in rows):
+            arrays[column] = rows
+            continue
+        stacked = np.stack(rows)
+        if (stacked == stacked[0]).all():
+            stacked = np.broadcast_to(stacked[0].copy(), stacked.shape)
+        arrays[column] = stacked
+    return arrays
+
+
+# plot types that can be packed into one glyph or summarized by bands
+_multi_types = ('Curve', 'Scatter')
+
+# the quantiles drawn in band mode: the 95% and 68% intervals and the median
+_band_quantiles = (0.025, 0.16, 0.5, 0.84, 0.975)
+
+
+# plot and style options the bokeh backend accepts for an element type, apart from colors
+def _compatible_options(element):
+    plot_class = hv.Store.registry['bokeh'][element]
+    return (set(plot_class.param) | set(plot_class.style_opts)) - {'color', 'cmap', 'color_index', 'alpha'}
+
+
+# whether a rendering mode applies to a selection of `count` indexes. mode is a bool, or the
+# number of selected indexes above which it applies
+def _above_threshold(mode, count):
+    if isinstance(mode, bool):
+        return mode
+    return mode is not None and count > mode
+
+
 #  given a param name, find corresponding latex-formatted param name
 def _lookup_latex_label(param, latex_dict):
     # handle default case of no latex paramname dictionary
@@ -67,6 +127,149 @@ class _observable_utils:
             print("BSAVI Observable")
             print(f"Name: {self.name[0]}")
 
+    # build the styled plot of the i-th observable from its unpacked data
+    def _make_plot(self, i, data):
+        if len(self.plot_type) == 1:
+            hv_element = getattr(hv, self.plot_type[0])
+        else:
+            hv_element = getattr(hv, self.plot_type[i])
+        kdim, vdim = data.keys()
+        plot = hv_element(data, kdim, vdim) #TODO
+        # plot = hv_element(data, kdim, vdim, label=self.name[i])
+        # set defaults
+        plot.opts(**self._default_opts(i, kdim, vdim))
+        # add user defined customizations
+        if self.plot_opts is not None:
+            if len(self.plot_opts) == 1:
+                plot.opts(self.plot_opts)
+            else:
+                plot.opts(self.plot_opts[i])
+        return plot
+
+    # all the curves (or scatters) of the i-th observable at the given indexes, packed into a single
+    # glyph with one color per index. None for plot types that can't be packed, e.g. Bars
+    def _make_multi_plot(self, i, data):
+        if self._plot_type(i) not in _multi_types or not data:
+            return None
+        kdim, vdim = next(iter(data.values())).keys()
+        if self._plot_type(i) == 'Curve':
+            lines = [{kdim: item[kdim], vdim: item[vdim], 'index': n} for n, item in data.items()]
+            plot = hv.Contours(lines, kdims=[kdim, vdim], vdims=['index'])
+        else:
+            columns = {
+                kdim: np.concatenate([item[kdim] for item in data.values()]),
+                vdim: np.concatenate([item[vdim] for item in data.values()]),
+                'index': np.concatenate([np.full(len(item[kdim]), n) for n, item in data.items()]),
+            }
+            plot = hv.Scatter(columns, kdims=[kdim], vdims=[vdim, 'index'])
+        plot.opts(**self._default_opts(i, kdim, vdim), color='index', cmap='Spectral_r', tools=['hover'])
+        self._apply_compatible_opts(plot, i)
+        return plot
+
+    # the curves of the i-th observable at the given indexes on the grid of the first one, as
+    # (kdim, vdim, grid, one row of values per index, indexes). None for an empty selection
+    def _stack(self, i, index, data):
+        index = [n for n in index if n in data]
+        if not index:
+            return None
+        kdim, vdim = data[index[0]].keys()
+        grid = np.asarray(data[index[0]][kdim], dtype=float)
+        rows = []
+        for n in index:
+            x = np.asarray(data[n][kdim], dtype=float)
+            y = np.asarray(data[n][vdim], dtype=float)
+            if x.shape != grid.shape or not np.array_equal(x, grid):
+                order = np.argsort(x)
+                y = np.interp(grid, x[order], y[order])
+            rows.append(y)
+        return kdim, vdim, grid, np.array(rows), np.array(index)
+
+    # the weighted median, 68% and 95% bands of the curves of the i-th observable at the given indexes,
+    # as label -> hv.Spread. weights has one value per sample. None if there is nothing to summarize
+    def _make_band_plot(self, i, index, data, weights=None):
+        if self._plot_type(i) not in _multi_types:
+            return None
+        stacked = self._stack(i, index, data)
+        if stacked is None:
+            return None
+        kdim, vdim, grid, values, index = stacked
+        # rows that haven't been computed, e.g. in a partial store, hold NaN
+        finite = np.isfinite(values).all(axis=1)
+        values, index = values[finite], index[finite]
+        if len(values) == 0:
+            return None
+        sample_weights = None if weights is None else np.asarray(weights, dtype=float)[index]
+        lower95, lower68, median, upper68, upper95 = weighted_quantiles(values, sample_weights, _band_quantiles)
+        defaults = self._default_opts(i, kdim, vdim)
+        defaults['title'] = f'{self.name[i]} - {len(values)} samples'
+        lower, upper = f'{vdim}_lower', f'{vdim}_upper'
+        zero = np.zeros_like(median)
+        plots = {
+            '95%': hv.Spread((grid, median, median - lower95, upper95 - median), kdims=[kdim], vdims=[vdim, lower, upper]).opts(
+                **defaults, color='#3288bd', alpha=0.25, line_alpha=0),
+            '68%': hv.Spread((grid, median, median - lower68, upper68 - median), kdims=[kdim], vdims=[vdim, lower, upper]).opts(
+                **defaults, color='#3288bd', alpha=0.45, line_alpha=0),
+            # an overlay holds one type of element: the median is a spread of zero width
+            'median': hv.Spread((grid, median, zero, zero), kdims=[kdim], vdims=[vdim, lower, upper]).opts(
+                **defaults, color='black', fill_alpha=0, line_width=2),
+        }
+        for plot in plots.values():
+            self._apply_compatible_opts(plot, i)
+        return plots
+
+    def _plot_type(self, i):
+        return self.plot_type[0] if len(self.plot_type) == 1 else self.plot_type[i]
+
+    def _default_opts(self, i, kdim, vdim):
+        return dict(
+            title=f'{self.name[i]}', 
+            height=400, 
+            width=500,
+            padding=0.1, 
+            fontscale=1.1,
+            xlabel=_lookup_latex_label(kdim, self.latex_labels), 
+            ylabel=_lookup_latex_label(vdim, self.latex_labels),
+            framewise=True
+        )
+
+    # the user's options were written for the per-index element: keep the ones another element
+    # type understands, and leave the colors to it
+    def _apply_compatible_opts(self, plot, i):
+        if self.plot_opts is None:
+            return
+        user_opts = self.plot_opts[0] if len(self.plot_opts) == 1 else self.plot_opts[i]
+        if user_opts is not None:
+            allowed = _compatible_options(type(plot))
+            plot.opts(**{key: value for key, value in user_opts.kwargs.items() if key in allowed})
+
+    def generate_plot(self, index: list, multiline: bool = False, bands: bool = False, weights=None):
+        _load_extensions()
+        plots_dict = {}
+        data = self.generate_data(index)
+        for i in range(0, self.number):
+            name = self.name[i]
+            summary = None
+            if bands:
+                summary = self._make_band_plot(i, index, data[name], weights)
+            elif multiline:
+                summary = self._make_multi_plot(i, data[name])
+            if summary is not None:
+                plots_dict[name] = summary
+            else:
+                plots_dict[name] = {n: self._make_plot(i, data[name][n]) for n in index}
+        return plots_dict
+
+    def draw_plot(self, index: list, multiline: bool = False, bands: bool = False, weights=None):
+        layout = hv.Layout()
+        plots = self.generate_plot(index, multiline, bands, weights)
+        for name in plots:
+            if isinstance(plots[name], dict):
+                overlay = hv.NdOverlay(plots[name], kdims='index').opts(legend_position='right')
+            else:
+                overlay = plots[name]
+            layout = layout + overlay
+        return layout.opts(shared_axes=False)
+
 
 class Observable(_observable_utils):
     """
@@ -103,59 +306,62 @@ class Observable(_observable_utils):
         super().__init__(name, plot_type, plot_opts, latex_labels)
         
         if isinstance(data, dict):
-            self.data = [data]
+            data = [data]
         elif isinstance(data, pd.core.frame.DataFrame):
+            # each column holds one dict of arrays per sample
             prms = []
             for column in data.columns:
-                dset = pd.DataFrame(list(data.loc[:, column]))
-                prms.append(dset)
-            self.data = prms
-        else:
-            self.data = data
-        
-    def generate_plot(self, index: list):
-        plots_dict = {}
+                cells = data[column].tolist()
+                prms.append({key: [cell[key] for cell in cells] for key in cells[0].keys()})
+            data = prms
+        self.data = [_as_arrays(dataset) for dataset in data]
+
+    @classmethod
+    def from_store(
+        cls,
+        store: str,
+        plot_type: Union[str, List[str]] = None,
+        plot_opts: Union[opts, List[opts]] = None,
+        latex_labels: dict = None
+    ):
+        """
+        Create an Observable from a store written by bsavi.precompute, in place of the
+        LiveObservable it was computed from. The arrays are memory-mapped, not read. by
+        default, each observable is drawn as the LiveObservable was, or as a Curve.
+        """
+        names, data = load_store(store)
+        if plot_type is None:
+            plot_type = [stored or 'Curve' for stored in _plot_types(store)]
+        return cls(names, data, plot_type, plot_opts, latex_labels)
+
+    # read the selected rows straight from the arrays when the dataset is tabulated on one grid
+    def _stack(self, i, index, data):
+        dataset = self.data[i]
+        if len(dataset) != 2 or not all(isinstance(column, np.ndarray) for column in dataset.values()):
+            return super()._stack(i, index, data)
+        kdim, vdim = dataset.keys()
+        index = np.asarray(index, dtype=np.intp)
+        if len(index) == 0:
+            return None
+        grids = dataset[kdim]
+        if grids.strides[0] != 0:
+            grids = grids[index]
+            if not (grids == grids[0]).all():
+                return super()._stack(i, index, data)
+        return kdim, vdim, np.asarray(grids[0], dtype=float), np.asarray(dataset[vdim][index], dtype=float), index
         
+    def generate_data(self, index: list):
+        """
+        Return the arrays behind the plots at the given indexes, as a dict of
+        observable name -> {index: {kdim: array, vdim: array}}.
+        """
+        data_dict = {name: {} for name in self.name}
         for i in range(0, self.number):
-            indexed_plots = []
+            dataset = self.data[i]
             for n in index:
-                if len(self.plot_type) == 1:
-                    hv_element = getattr(hv, self.plot_type[0])
-                else:
-                    hv_element = getattr(hv, self.plot_type[i])
-                dataset = self.data[i]
                 unpacked_data = _unpacker(dataset, n)
-                kdim, vdim = unpacked_data.keys()
-                plot = hv_element(unpacked_data, kdim, vdim) #TODO
-                # plot = hv_element(unpacked_data, kdim, vdim, label=self.name[i])
-                # set defaults
-                plot.opts(
-                    title=f'{self.name[i]}', 
-                    height=400, 
-                    width=500,
-                    padding=0.1, 
-                    fontscale=1.1,
-                    xlabel=_lookup_latex_label(kdim, self.latex_labels), 
-                    ylabel=_lookup_latex_label(vdim, self.latex_labels),
-                    framewise=True
-                )
-                # add user defined customizations
-                if self.plot_opts is not None:
-                    if len(self.plot_opts) == 1:
-                        plot.opts(self.plot_opts)
-                    else:
-                        plot.opts(self.plot_opts[i])
-                indexed_plots.append(plot)
-                plots_dict[self.name[i]] = dict(zip(index, indexed_plots))
-        return plots_dict
-        
-    def draw_plot(self, index: list):
-        layout = hv.Layout()
-        plots = self.generate_plot(index)
-        for name in plots:
-            overlay = hv.NdOverlay(plots[name], kdims='index').opts(legend_position='right')
-            layout = layout + overlay
-        return layout.opts(shared_axes=False)
+                data_dict[self.name[i]][n] = {key: np.asarray(unpacked_data[key]) for key in unpacked_data.keys()}
+        return data_dict
         
 
 class LiveObservable(_observable_utils):
@@ -184,6 +390,26 @@ class LiveObservable(_observable_utils):
     latex_labels: dict
         dictionary of plain text parameter names as keys and 
         latex versions as values for the data table
+
+    cache: DiskCache or string
+        opt-in disk cache (or its directory) for the results of myfunc, shared across
+        sessions and processes. results are keyed by the function, cache_version and the
+        values of the selected row of every table in myfunc_args, so duplicate samples
+        are only computed once. without a table among myfunc_args, the selected index is
+        part of the key
+
+    cache_version: string
+        version of myfunc for the cache. by default a hash of its bytecode, so editing
+        the function invalidates its results. bump it when something else myfunc
+        depends on changes
+
+    executor: 'thread', 'process' or concurrent.futures.Executor
+        evaluate myfunc for several selected indices at the same time. with 'process',
+        myfunc and myfunc_args must be picklable, and are sent to each worker once. in viz,
+        results are drawn as they arrive and errors are shown above the observables
+
+    max_workers: int
+        maximum number of concurrent evaluations when executor is 'thread' or 'process'
     """    
     def __init__(
         self, 
@@ -192,57 +418,119 @@ class LiveObservable(_observable_utils):
         myfunc_args: tuple,
         plot_type: Union[str, List[str]] = None,
         plot_opts: Union[opts, List[opts]] = None,
-        latex_labels: dict = None
+        latex_labels: dict = None,
+        cache: Union[DiskCache, str] = None,
+        cache_version: str = None,
+        executor: Union[str, Executor] = None,
+        max_workers: int = None
     ):
         super().__init__(name, plot_type, plot_opts, latex_labels)
         self.myfunc = myfunc
         self.myfunc_args = myfunc_args
+        if isinstance(cache, str):
+            cache = DiskCache(cache)
+        self.cache = cache
+        self.cache_version = cache_version
+        if executor not in (None, 'thread', 'process') and not isinstance(executor, Executor):
+            raise ValueError(f"executor must be 'thread', 'process' or an Executor, got {executor!r}")
+        self.executor = executor
+        self.max_workers = max_workers
+        self._pool = None
 
     def properties(self):
         super().properties()
         print(f'Calculated by {self.myfunc.__name__}')
-    def generate_plot(self, index: list):
-        plots_dict = {k: {} for k in self.name}
+    def generate_data(self, index: list):
+        """
+        Return the arrays computed by myfunc at the given indexes, as a dict of
+        observable name -> {index: {kdim: array, vdim: array}}.
+        """
+        data_dict = {name: {} for name in self.name}
+        for n, data in self.iter_data(index):
+            for name in self.name:
+                data_dict[name][n] = data[name]
+        return data_dict
 
-        for n in index:
-            computed_data = self.myfunc(n, *self.myfunc_args)
-            
-            for i in range(0, self.number):
-                if len(self.plot_type) == 1:
-                    hv_element = getattr(hv, self.plot_type[0])
-                else:
-                    hv_element = getattr(hv, self.plot_type[i])  
-                dataset = computed_data[i]
-                kdim, vdim = dataset.keys()
-                plot = hv_element(dataset, kdim, vdim) #TODO
-                # plot = hv_element(dataset, kdim, vdim, label=self.name[i])
-                # set defaults
-                plot.opts(
-                    title=f'{self.name[i]}',
-                    height=400,
-                    width=500,
-                    padding=0.1,
-                    fontscale=1.1,
-                    xlabel=_lookup_latex_label(kdim, self.latex_labels), 
-                    ylabel=_lookup_latex_label(vdim, self.latex_labels),
-                    framewise=True
-                )
-                # add user defined customizations
-                if self.plot_opts is not None:
-                    if len(self.plot_opts) == 1:
-                        plot.opts(self.plot_opts)
-                    else:
-                        plot.opts(self.plot_opts[i])
-                plots_dict[self.name[i]].update({n: plot})
-        return plots_dict
+    def iter_data(self, index: list):
+        """
+        Yield (index, {observable name: {kdim: array, vdim: array}}) for each of the given
+        indexes as soon as it is ready. with an executor, results come in completion order.
+        """
+        # indexes that share a cache key are computed once
+        cache = self.cache
+        keys = list(index)
+        if cache is not None:
+            try:
+                keys = [result_key(self.myfunc, self.myfunc_args, n, self.cache_version) for n in index]
+            except TypeError as error:
+                warnings.warn(f'{error}, so the results of {self.myfunc.__name__} are not cached')
+                cache = None
+        groups = {}
+        for n, key in zip(index, keys):
+            groups.setdefault(key, []).append(n)
+        todo = []
+        for key, group in groups.items():
+            result = None if cache is None else cache.get(key)
+            if result is None:
+                todo.append(key)
+            else:
+                yield from self._unpack(group, result)
 
-    def draw_plot(self, index: list):
-        layout = hv.Layout()
-        plots = self.generate_plot(index)
-        for name in plots:
-            overlay = hv.NdOverlay(plots[name], kdims='index').opts(legend_position='right')
-            layout = layout + overlay
-        return layout.opts(shared_axes=False)
+        pool = self._get_pool()
+        if pool is None:
+            for key in todo:
+                result = self.myfunc(groups[key][0], *self.myfunc_args)
+                self._store(cache, key, result)
+                yield from self._unpack(groups[key], result)
+            return
+        futures = {self._submit(pool, groups[key][0]): key for key in todo}
+        try:
+            for future in as_completed(futures):
+                key = futures[future]
+                result = future.result()
+                self._store(cache, key, result)
+                yield from self._unpack(groups[key], result)
+        finally:
+            # the consumer stopped early: drop the evaluations that haven't started
+            for future in futures:
+                future.cancel()
+
+    def _get_pool(self):
+        if self.executor is None or isinstance(self.executor, Executor):
+            return self.executor
+        if self._pool is None:
+            if self.executor == 'thread':
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                # myfunc and its arguments, e.g. the samples, are sent to each worker once rather than with every index
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                 initargs=(self.myfunc, self.myfunc_args))
+        return self._pool
+
+    def _submit(self, pool, n):
+        if pool is self._pool and self.executor == 'process':
+            return pool.submit(_call_worker, n)
+        return pool.submit(self.myfunc, n, *self.myfunc_args)
+
+    def _store(self, cache, key, result):
+        if cache is not None:
+            cache.put(key, result)
+
+    def _unpack(self, group, result):
+        data = {
+            self.name[i]: {key: np.asarray(result[i][key]) for key in result[i].keys()}
+            for i in range(0, self.number)
+        }
+        for n in group:
+            yield n, data
+
+    def __getstate__(self):
+        # executors can't be pickled; the copy creates its own pool when needed
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        if isinstance(state['executor'], Executor):
+            state['executor'] = None
+        return state
         
 
 # generate the visualization
@@ -250,15 +538,29 @@ def viz(
     data, 
     observables: list[Union[Observable, LiveObservable]] = None, 
     show_observables: bool = False, 
-    latex_dict: dict = None
+    latex_dict: dict = None,
+    rasterize: bool = False,
+    plot_cache: PlotCache = None,
+    multiline: Union[bool, int] = False,
+    bands: Union[bool, int] = False,
+    weights: Union[str, np.ndarray] = None,
+    incremental: bool = False,
+    page_size: int = 20,
+    debug: bool = False,
+    crossfilter: Union[bool, list] = False,
+    density=False,
+    follow_period: float = 5.0
     ):
     """
     Interactive dashboard linking data and observables
 
     Parameters
     ----------
-    data: Pandas DataFrame
-        a table containing samples of parameter values
+    data: Pandas DataFrame, ChainDataset or ChainFollower
+        a table containing samples of parameter values. a ChainDataset is read lazily,
+        only the plotted columns and the selected rows are loaded into memory. a
+        ChainFollower is polled every follow_period seconds, and the rows appended to the
+        chains are streamed into the scatter plot and the table
     
     observables: list[Observable | LiveObservable]
         a list of Observables corresponding to the samples
@@ -269,7 +571,69 @@ def viz(
     latex_labels: dict
         dictionary of plain text parameter names as keys and 
         latex versions as values for the data table
+
+    rasterize: bool
+        aggregate the sample scatter into an image on the server with datashader
+        instead of sending every point to the browser. the colormap dimension is
+        averaged per pixel, and box and lasso selections are resolved to sample
+        indices on the server. use this for chains with more than ~10^5 samples
+
+    plot_cache: PlotCache
+        LRU cache for the arrays behind the observable plots of selected indices.
+        by default each dashboard keeps up to 128 MiB
+
+    multiline: bool or int
+        draw all the selected curves of an observable as a single glyph, colored by index,
+        instead of one plot per index. pass a number to only do so when more indexes than
+        that are selected. keeps the browser responsive for selections of hundreds of samples
+
+    bands: bool or int
+        summarize the selected curves of an observable by their median and 68% and 95%
+        bands instead of drawing each of them. pass a number to only do so when more
+        indexes than that are selected. takes precedence over multiline
+
+    weights: string or array-like
+        column of data holding the weight of each sample, or the weights themselves,
+        used for the bands. samples are weighted equally by default
+
+    incremental: bool
+        update the panels of Curve observables by sending only the curves of the indexes
+        added to or removed from the selection, instead of redrawing every panel. each
+        panel draws its curves as a single glyph, as with multiline
+
+    page_size: int
+        number of rows per page of the table of selected points
+
+    debug: bool
+        show the latency of each stage of the dashboard under it. also times the
+        serialization of the changes sent to the browser, at the cost of doing it twice.
+        the stages are always recorded, see Metrics and serve_metrics
+
+    crossfilter: bool or list of strings
+        replace the scatter plot with panels of every pair of the given columns (the first
+        four by default), where brushing a box in one panel filters all the others. the
+        samples passing every filter are the selection. panels are 2D histograms when
+        rasterize is True
+
+    density: bool, Pandas DataFrame or ChainDataset
+        draw the weighted 2D density of the plotted pair with its 68% and 95% credible
+        contours under the points, and the 1D marginals of both axes beside them. pass the
+        full chains to compute the densities from them while data holds a subsample. the
+        samples are weighted by weights, and the densities are computed once per column
+        or pair
+
+    follow_period: float
+        seconds between two polls of the chain files when data is a ChainFollower
     """
+    _load_extensions()
+
+    # the chains written so far are read now, and the rest as it is appended
+    follower = None
+    if isinstance(data, ChainFollower):
+        if rasterize or crossfilter:
+            raise ValueError('a ChainFollower can only be shown in the point scatter, without rasterize or crossfilter')
+        follower, data = data, data.poll()
+
     # setting Panel widgets for user interaction
     variables = data.columns.values.tolist()
     var1 = pn.widgets.Select(value=variables[0], name='Horizontal Axis', 
@@ -281,9 +645,10 @@ def viz(
     cmap_option = pn.widgets.Checkbox(value=True, name='Show Colormap', 
                                       align='end',width=150)
 
+    drawn = {}
     # function for generating the scatter plot, given 2 dimensions as x and y axes, and an additional dimension to colormap
     # to the points on the plot. Also has an option to show or hide the colormap
-    def plot_data(kdim1, kdim2, colordim, showcmap):
+    def plot_data(kdim1, kdim2, colordim, showcmap, data=data):
         if showcmap == True:
             cmapping = opts.Points(
                 color=dim(colordim),
@@ -305,45 +670,154 @@ def viz(
             #alpha=0.75, selection_alpha=1, nonselection_alpha=0.1,
             tools=[hover, 'box_select','lasso_select','tap'],
             size=7)
-        points = hv.Points(data, kdims=[kdim1, kdim2]).opts(popts, cmapping)
+        # only hand the plotted columns to holoviews. followed chains are handed over whole, so that
+        # HoloViews recognizes the data of its buffer and only sends the appended rows, unless the
+        # axes changed and the glyphs need all of their data again
+        columns = list(dict.fromkeys([kdim1, kdim2, colordim]))
+        if follower is None:
+            frame = data[columns]
+        elif drawn.get('axes') == (kdim1, kdim2, colordim, showcmap):
+            frame = data
+        else:
+            frame = data.copy(deep=False)
+        drawn['axes'] = (kdim1, kdim2, colordim, showcmap)
+        points = hv.Points(frame, kdims=[kdim1, kdim2]).opts(popts, cmapping)
         return points
     
+    # the plotted columns, read once per choice of axes so zooming doesn't reread them
+    plotted = {}
+    def plotted_columns(columns):
+        if plotted.get('columns') != columns:
+            plotted.update(columns=columns, frame=data[columns])
+        return plotted['frame']
+
+    # large-data version of plot_data: aggregate the samples in the visible ranges into an image
+    def plot_raster(kdim1, kdim2, colordim, showcmap, x_range=None, y_range=None):
+        # ranges reported for the previous pair of axes don't apply to the new one
+        if plotted.get('axes') != (kdim1, kdim2):
+            plotted['axes'] = (kdim1, kdim2)
+            x_range = y_range = None
+        frame = plotted_columns(list(dict.fromkeys([kdim1, kdim2, colordim])))
+        canvas = ds.Canvas(plot_width=500, plot_height=400, x_range=x_range, y_range=y_range)
+        if showcmap == True:
+            agg = canvas.points(frame, kdim1, kdim2, ds.mean(colordim)).rename(colordim)
+            cmapping = opts.Image(cmap='Spectral_r')
+        else:
+            agg = canvas.points(frame, kdim1, kdim2, ds.count()).rename('count')
+            cmapping = opts.Image(cmap='Greys', cnorm='eq_hist')
+        iopts = opts.Image(
+            title='Sample Data',
+            bgcolor='#FEFEFE',
+            fontscale=1.1,
+            xlabel=_lookup_latex_label(kdim1, latex_dict),
+            ylabel=_lookup_latex_label(kdim2, latex_dict),
+            toolbar='above',
+            colorbar=True,
+            tools=['box_select', 'lasso_select'])
+        return hv.Image(agg, kdims=[kdim1, kdim2]).opts(iopts, cmapping)
+
     # bind the widget values to the plotting function so it gets called every time the user interacts with the widget
     # call the bound plotting function inside a holoview DynamicMap object for interaction
-    interactive_points = pn.bind(plot_data, kdim1=var1, kdim2=var2, colordim=cmap_var, showcmap=cmap_option)
-    points_dmap = hv.DynamicMap(interactive_points, kdims=[]).opts(width=500, height=400, framewise=True)
-    
-    # define a stream to get a list of all the points the user has selected on the plot
-    selection = streams.Selection1D(source=points_dmap)
-    
-    # formatting the table using plot hooks
-    def hook(plot, element):
-        plot.handles['table'].autosize_mode = "none"
-        for column in plot.handles['table'].columns:
-            column.width = 100
-    
-    # function to generate a table of all the selected points
-    def make_table(kdim1, kdim2, colordim):
-        table_options = opts.Table(
-            height=300, 
-            width=600, 
-            hooks=[hook], 
-            bgcolor='#f5f5f5'
-        )
-        data_with_index = data.reset_index()
-        table = hv.DynamicMap(
-            lambda index: hv.Table(data_with_index.iloc[index], kdims=['index', kdim1, kdim2, colordim]), 
-            streams=[selection]
-        )
-        return table.opts(table_options).relabel('Selected Points')
-    
+    if crossfilter:
+        columns = variables[:4] if crossfilter is True else list(crossfilter)
+        matrix = ScatterMatrix(data, columns, rasterize=rasterize,
+                               labels={column: _lookup_latex_label(column, latex_dict) for column in columns})
+        # the samples passing the filters are resolved on the server, as with rasterize
+        selection = streams.Stream.define('Selection', index=[])()
+        matrix.on_change(lambda index: selection.event(index=index))
+    elif rasterize:
+        try:
+            import datashader as ds
+        except ImportError:
+            raise ImportError('viz(rasterize=True) requires datashader: pip install datashader')
+        interactive_raster = pn.bind(plot_raster, kdim1=var1, kdim2=var2, colordim=cmap_var, showcmap=cmap_option)
+        points_dmap = hv.DynamicMap(interactive_raster, streams=[streams.RangeXY()]).opts(
+            width=500, height=400, framewise=True)
+
+        # box and lasso geometry comes back from the browser and is resolved to indices here.
+        # a Selection1D without a source would be linked to the observables plot instead
+        selection = streams.Stream.define('Selection', index=[])()
+        box = streams.BoundsXY(source=points_dmap)
+        lasso = streams.Lasso(source=points_dmap)
+        # spatial index over the current axes, built on the first selection and dropped when the axes change
+        spatial = {}
+        def spatial_index():
+            axes = (var1.value, var2.value)
+            if spatial.get('axes') != axes:
+                frame = plotted_columns(list(dict.fromkeys([var1.value, var2.value, cmap_var.value])))
+                spatial.update(axes=axes, index=SpatialIndex(frame[var1.value].to_numpy(), frame[var2.value].to_numpy()))
+            return spatial['index']
+        def select_box(bounds):
+            if bounds is not None:
+                selection.event(index=spatial_index().box(bounds).tolist())
+        def select_lasso(geometry):
+            if geometry is not None:
+                selection.event(index=spatial_index().lasso(geometry).tolist())
+        def clear_index(event):
+            spatial.clear()
+        var1.param.watch(clear_index, 'value')
+        var2.param.watch(clear_index, 'value')
+        box.add_subscriber(select_box)
+        lasso.add_subscriber(select_lasso)
+    else:
+        interactive_points = pn.bind(plot_data, kdim1=var1, kdim2=var2, colordim=cmap_var, showcmap=cmap_option)
+        if follower is None:
+            points_dmap = hv.DynamicMap(interactive_points, kdims=[]).opts(width=500, height=400, framewise=True)
+        else:
+            # appended rows are streamed into the glyphs of the scatter plot with ColumnDataSource.stream
+            samples = streams.Buffer(data, length=2**31 - 1, index=False)
+            points_dmap = hv.DynamicMap(interactive_points, streams=[samples]).opts(width=500, height=400, framewise=True)
+
+        # define a stream to get a list of all the points the user has selected on the plot
+        selection = streams.Selection1D(source=points_dmap)
     
-    # generate the table
-    selected_table = pn.bind(
-        make_table, 
-        kdim1=var1, 
-        kdim2=var2, 
-        colordim=cmap_var)
+    # latency of each stage, from the first subscriber of the selection to the last one,
+    # which runs after HoloViews has updated the plots
+    metrics = Metrics()
+    debug_pane = pn.pane.Str('', sizing_mode='stretch_width') if debug else None
+    timing = {}
+    def selection_started(**kwargs):
+        timing.update(start=time.perf_counter(), drawn=None, events=[])
+        if debug and pn.state.curdoc is not None:
+            pn.state.curdoc.on_change(timing['events'].append)
+    def selection_finished(**kwargs):
+        if 'start' not in timing:
+            return
+        end = time.perf_counter()
+        metrics.record('selection', end - timing['start'])
+        if timing['drawn'] is not None:
+            metrics.record('render', end - timing['drawn'])
+        if debug:
+            if pn.state.curdoc is not None:
+                pn.state.curdoc.remove_on_change(timing['events'].append)
+            if timing['events']:
+                with metrics.stage('serialize'):
+                    message = Protocol().create('PATCH-DOC', timing['events'])
+                metrics.count('patch_bytes', len(message.content_json) + sum(len(buffer[1]) for buffer in message.buffers))
+            debug_pane.object = metrics.table()
+        timing.clear()
+    selection.add_subscriber(selection_started)
+    selection.add_subscriber(selection_finished, precedence=2)
+
+    # table of the selected points, sorted and paged on the server
+    table = SelectionTable(data, page_size, columns if crossfilter else [var1.value, var2.value, cmap_var.value])
+    def update_table(index):
+        with metrics.stage('table'):
+            table.update(index)
+    selection.add_subscriber(update_table)
+    def reorder_table(event):
+        table.set_first_columns([var1.value, var2.value, cmap_var.value])
+    for widget in (var1, var2, cmap_var):
+        widget.param.watch(reorder_table, 'value')
+    selected_table = table.panel
+
+    if follower is not None:
+        def follow():
+            new_rows = follower.poll()
+            if len(new_rows):
+                samples.send(new_rows)
+                table.set_data(samples.data)
+        pn.state.add_periodic_callback(follow, period=int(1000 * follow_period))
     
     #table_stream = streams.Selection1D(source=selected_table)
     
@@ -367,55 +841,242 @@ def viz(
             else:
                 plotting_info[each.name[i]] = {'type': each.plot_type[i], 'opts': specific_opts}
     
+    # the observable and position within it that draws each plot
+    owners = {name: (each, i) for each in observables for i, name in enumerate(each.name)}
+    if plot_cache is None:
+        plot_cache = PlotCache()
+
+    # results of observables with an executor are computed in the background and
+    # drawn as they arrive. `streamed` holds those of the current selection
+    refresh = streams.Counter()
+    streamed = {'selected': set(), 'data': {}, 'pending': set(), 'scheduled': False}
+
+    def request_refresh(doc):
+        # coalesce the redraws requested by results arriving close together
+        if streamed['scheduled']:
+            return
+        streamed['scheduled'] = True
+        def fire():
+            streamed['scheduled'] = False
+            refresh.event()
+        if doc is not None:
+            doc.add_next_tick_callback(fire)
+        else:
+            fire()
+
+    # errors of the background evaluations are logged and shown above the observables until the next selection
+    errors_pane = pn.pane.Alert('', alert_type='danger', visible=False, sizing_mode='stretch_width')
+    def report_error(message, doc):
+        def show():
+            errors_pane.object = message
+            errors_pane.visible = True
+        if doc is not None:
+            doc.add_next_tick_callback(show)
+        else:
+            show()
+
+    def stream_results(each, new_index, doc):
+        try:
+            for n, data in each.iter_data(new_index):
+                for name in each.name:
+                    plot_cache.put((name, n), data[name])
+                streamed['pending'].discard((id(each), n))
+                if n in streamed['selected']:
+                    for name in each.name:
+                        streamed['data'][(name, n)] = data[name]
+                    request_refresh(doc)
+        except Exception as error:
+            logger.exception('computing %s for samples %s failed', ', '.join(each.name), new_index)
+            report_error(f'Computing {", ".join(each.name)} failed: {type(error).__name__}: {error}', doc)
+        finally:
+            streamed['pending'].difference_update((id(each), n) for n in new_index)
+
+    # weights of the samples for the bands, read once
+    sample_weights = {}
+    def band_weights():
+        if weights is None or not isinstance(weights, str):
+            return weights
+        if 'values' not in sample_weights:
+            sample_weights['values'] = np.asarray(data[weights], dtype=float)
+        return sample_weights['values']
+
+    # look up the arrays of every selected index in the cache and compute the ones that are
+    # missing, observable by observable. indexes still being computed in the background are left out.
+    # incremental and redrawn panels update on the same event, and share what the first one gathered
+    gathered = {'event': 0, 'key': None, 'data': None}
+    def next_event(**kwargs):
+        gathered['event'] += 1
+
+    def gather(index):
+        key = (gathered['event'], tuple(index))
+        if gathered['key'] != key:
+            with metrics.stage('generate_plot'):
+                gathered.update(key=key, data=gather_data(index))
+        return gathered['data']
+
+    def gather_data(index):
+        if set(index) != streamed['selected']:
+            streamed.update(selected=set(index), data={})
+            errors_pane.visible = False
+        selected_data = {name: {} for name in plotting_info}
+        for each in observables:
+            new_index = []
+            for n in index:
+                cached = [plot_cache.get((name, n)) or streamed['data'].get((name, n)) for name in each.name]
+                if any(item is None for item in cached):
+                    new_index.append(n)
+                else:
+                    for name, item in zip(each.name, cached):
+                        selected_data[name][n] = item
+            metrics.count('cache_hit', len(index) - len(new_index))
+            metrics.count('cache_miss', len(new_index))
+            if not new_index:
+                continue
+            if getattr(each, 'executor', None) is not None:
+                new_index = [n for n in new_index if (id(each), n) not in streamed['pending']]
+                if new_index:
+                    streamed['pending'].update((id(each), n) for n in new_index)
+                    Thread(target=stream_results, args=(each, new_index, pn.state.curdoc), daemon=True).start()
+                continue
+            with metrics.stage('generate_data'):
+                new_data = each.generate_data(new_index)
+            for name in each.name:
+                for n in new_index:
+                    plot_cache.put((name, n), new_data[name][n])
+                    selected_data[name][n] = new_data[name][n]
+        return selected_data
+
+    # panels of Curve observables that are updated by diff rather than redrawn
+    panels = {}
+    if incremental:
+        panels = {name: IncrementalCurves(*owners[name]) for name in plotting_info if plotting_info[name]['type'] == 'Curve'}
+    redrawn = [name for name in plotting_info if name not in panels]
+
+    def update_panels(**kwargs):
+        index = selection.index
+        selected_data = gather(index) if index else {name: {} for name in plotting_info}
+        with metrics.stage('panels'):
+            for name, panel in panels.items():
+                panel.update({n: selected_data[name][n] for n in index if n in selected_data[name]})
+
     # handles the null selection case and multiple selections
-    plot_dict = {k: {} for k in list(plotting_info.keys())}
     
-    def plot_observables(index):
+    def plot_observables(index, counter=0):
+        selected_data = gather(index) if index else None
+        with metrics.stage('layout'):
+            layout = build_layout(index, selected_data)
+        if 'start' in timing:
+            timing['drawn'] = time.perf_counter()
+        return layout
+
+    # an empty plot of the observable with its options, titled with what is missing
+    def empty_overlay(name, title):
+        # get name of plot element (type)
+        hv_type = getattr(hv, plotting_info[name]['type'])
+        # generate empty plot with default options
+        empty_plot = hv_type(np.random.rand(0, 2), group=f'{name}', label='None').opts(
+            title=f'{name} - {title}', height=400, width=500, fontscale=1.1, framewise=True)
+        # apply custom options if specified
+        if plotting_info[name]['opts'] is not None:
+            empty_plot.opts(plotting_info[name]['opts'])
+        return hv.NdOverlay({'none': empty_plot}, kdims='index').opts(legend_position='right')
+
+    def build_layout(index, selected_data):
         if not index:
             layout = hv.Layout()
-            for name in plotting_info:
-                # get name of plot element (type)
-                hv_type = getattr(hv, plotting_info[name]['type'])
-                # generate empty plot with default options
-                empty_plot = hv_type(np.random.rand(0, 2), group=f'{name}', label='None').opts(
-                    title=f'{name} - No Selection', height=400, width=500, fontscale=1.1, framewise=True)
-                # apply custom options if specified
-                if plotting_info[name]['opts'] is not None:
-                    empty_plot.opts(plotting_info[name]['opts'])
-                # make an empty NdOverlay and append to layout
-                empty_overlay = hv.NdOverlay({'none': empty_plot}, kdims='index').opts(legend_position='right')
-                layout = layout + empty_overlay
+            for name in redrawn:
+                layout = layout + empty_overlay(name, 'No Selection')
         else:
-            # get the indices that haven't been seen before
-            new_index = [x for x in index if x not in list(plot_dict[list(plot_dict.keys())[0]].keys())]
-            # go through each observable and generate its plots, adding them
-            # to the shared plot_dict
-            for each in observables:
-                new_plots = each.generate_plot(new_index)
-                # observable names should match plot_dict keys
-                for key in each.name:
-                    if new_index:
-                        plot_dict[key].update(new_plots[key])
             # recursively build a layout of NdOverlays
             layout = hv.Layout()
-            for key in plot_dict:
-                filtered_indexed_plots = {idx_num: plot_dict[key][idx_num] for idx_num in index}
+            for name in redrawn:
+                each, i = owners[name]
+                available = {n: selected_data[name][n] for n in index if n in selected_data[name]}
+                if not available:
+                    # every selected sample is still being computed in the background
+                    layout = layout + empty_overlay(name, 'Computing')
+                    continue
+                summary = None
+                if _above_threshold(bands, len(available)):
+                    summary = each._make_band_plot(i, list(available), available, band_weights())
+                elif _above_threshold(multiline, len(available)):
+                    packed = each._make_multi_plot(i, available)
+                    summary = None if packed is None else {'selected': packed}
+                if summary is not None:
+                    filtered_indexed_plots = summary
+                else:
+                    filtered_indexed_plots = {idx_num: each._make_plot(i, available[idx_num]) for idx_num in available}
                 overlay = hv.NdOverlay(filtered_indexed_plots, kdims='index').opts(legend_position='right')
                 layout = layout + overlay
     
         layout.opts(shared_axes=False, toolbar='left').cols(2)
         return layout
     
+    # weighted posterior densities of the full chains, drawn as light layers under the points
+    chains = data if density is True else density
+    densities = {}
+    def chain_values(column):
+        if ('values', column) not in densities:
+            densities[('values', column)] = _column_values(chains, column, len(chains))
+        return densities[('values', column)]
+    def chain_weights():
+        if isinstance(weights, str):
+            return chain_values(weights) if weights in chains.columns else None
+        return weights
+
+    def plot_density(kdim1, kdim2):
+        if ('2d', kdim1, kdim2) not in densities:
+            x, y, grid = weighted_density_2d(chain_values(kdim1), chain_values(kdim2), chain_weights())
+            densities[('2d', kdim1, kdim2)] = (x, y, grid, credible_levels(grid))
+        x, y, grid, levels = densities[('2d', kdim1, kdim2)]
+        image = hv.Image((x, y, grid.astype(np.float32)), kdims=[kdim1, kdim2], vdims=['density']).opts(
+            cmap='Blues', alpha=0.6, colorbar=False)
+        contours = hv.operation.contours(image, levels=sorted(levels), filled=False).opts(
+            cmap=['#08306b'], line_width=1.5, colorbar=False, show_legend=False)
+        return image * contours
+
+    def plot_marginal(column, vertical=False):
+        if ('1d', column) not in densities:
+            densities[('1d', column)] = weighted_histogram(chain_values(column), chain_weights(), smooth=1.0)
+        edges, values = densities[('1d', column)]
+        size = dict(width=120, height=400) if vertical else dict(width=500, height=120)
+        return hv.Histogram((edges, values), kdims=[column], vdims=['density']).opts(
+            color='#3288bd', line_alpha=0, alpha=0.6, invert_axes=vertical, toolbar=None,
+            xlabel='' if vertical else _lookup_latex_label(column, latex_dict), ylabel='',
+            xaxis=None if vertical else 'bottom', yaxis=None if not vertical else 'left', **size)
+
     # put it all together using Panel
-    input_panel = pn.Row(
-        pn.Column(var1, var2, cmap_var, cmap_option), 
-        points_dmap
-    )
+    if crossfilter:
+        input_panel = matrix.panel
+    elif density is not False and density is not None:
+        density_dmap = hv.DynamicMap(pn.bind(plot_density, kdim1=var1, kdim2=var2))
+        input_panel = pn.Row(
+            pn.Column(var1, var2, cmap_var, cmap_option),
+            pn.Column(
+                pn.Row(density_dmap * points_dmap, pn.bind(plot_marginal, column=var2, vertical=True)),
+                pn.bind(plot_marginal, column=var1)
+            )
+        )
+    else:
+        input_panel = pn.Row(
+            pn.Column(var1, var2, cmap_var, cmap_option), 
+            points_dmap
+        )
     dashboard = pn.Column(input_panel, selected_table)
     
     if show_observables == True:
-        observables_dmap = hv.DynamicMap(plot_observables, streams=[selection]).opts(framewise=True)
-        observables_pane = pn.panel(observables_dmap)
+        observables_pane = pn.Column(errors_pane)
+        selection.add_subscriber(next_event, precedence=-1)
+        refresh.add_subscriber(next_event, precedence=-1)
+        if panels:
+            selection.add_subscriber(update_panels)
+            refresh.add_subscriber(update_panels)
+            observables_pane.append(pn.GridBox(*[panel.pane for panel in panels.values()], ncols=2))
+        if redrawn or not panels:
+            observables_dmap = hv.DynamicMap(plot_observables, streams=[selection, refresh]).opts(framewise=True)
+            observables_pane.append(pn.panel(observables_dmap))
         dashboard = pn.Row(dashboard, observables_pane)
+    if debug:
+        dashboard = pn.Column(dashboard, pn.Card(debug_pane, title='Latency (ms)', collapsed=False))
     
     return dashboard
@@ -0,0 +1,266 @@
+import os
+import types
+import pickle
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+from collections import OrderedDict
+from threading import Lock
+
+
+# approximate memory held by a cached entry: the arrays inside a (nested) dict or list
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+class PlotCache:
+    """
+    Memory-bounded LRU cache for the data behind observable plots.
+
+    Entries are the unpacked arrays of one observable at one sample index, keyed by
+    (observable name, index). When either budget is exceeded the least recently used
+    entries are evicted. Counts hits, misses and evictions.
+
+    Parameters
+    ----------
+    max_entries: int
+        maximum number of entries kept. None for no limit
+
+    max_bytes: int
+        maximum total size of the cached arrays. None for no limit
+    """
+    def __init__(self, max_entries: int = None, max_bytes: int = 2**27):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Return the cache counters and current size as a dict."""
+        return {
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class DiskCache:
+    """
+    Content-addressed disk cache for the results of LiveObservable functions.
+
+    Each result is a list of dicts of arrays, stored as one .npz file named by its key.
+    Files are written to a temporary name and renamed into place, so several sessions
+    and processes can share the same directory safely. When the directory grows past
+    max_bytes the least recently used files are removed.
+
+    Parameters
+    ----------
+    directory: string
+        where the results are stored. created if it does not exist
+
+    max_bytes: int
+        size budget of the directory. None for no limit
+    """
+    def __init__(self, directory: str, max_bytes: int = 2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._nbytes = self._scan()[1]
+        self._lock = Lock()
+
+    # the cached files, oldest use first, and their total size
+    def _scan(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        return files, sum(size for _, size, _ in files)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as stored:
+                names = stored['__names__']
+                result = [{} for _ in range(int(stored['__count__']))]
+                for j, name in enumerate(names):
+                    i, column = name.split('\t', 1)
+                    result[int(i)][column] = stored[f'arr_{j}']
+            # mark as recently used for eviction
+            os.utime(path)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+        return result
+
+    def put(self, key, value):
+        arrays = {}
+        names = []
+        for i, dataset in enumerate(value):
+            for column in dataset.keys():
+                arrays[f'arr_{len(names)}'] = np.asarray(dataset[column])
+                names.append(f'{i}\t{column}')
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, __names__=np.array(names), __count__=len(value), **arrays)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            self._nbytes += os.path.getsize(self._path(key))
+            if self.max_bytes is not None and self._nbytes > self.max_bytes:
+                self._evict()
+
+    # other processes write to the same directory, so rescan before deciding what to remove
+    def _evict(self):
+        files, self._nbytes = self._scan()
+        for _, size, path in files:
+            if self._nbytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._nbytes -= size
+
+    def clear(self):
+        for _, _, path in self._scan()[0]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._nbytes = 0
+
+
+# stable description of a value for cache keys. tables contribute their row at the given index,
+# containers their items, functions their code, and other objects their pickle
+def _fingerprint(value, index):
+    if hasattr(value, 'iloc') and hasattr(value, 'columns'):
+        return repr(list(value.iloc[index].items()))
+    if isinstance(value, (str, bytes, int, float, complex, bool, type(None))):
+        return repr(value)
+    if isinstance(value, np.ndarray):
+        digest = hashlib.sha256(f'{value.dtype.str}{value.shape}'.encode())
+        digest.update(np.ascontiguousarray(value).tobytes() if value.dtype.kind != 'O' else pickle.dumps(value.tolist()))
+        return digest.hexdigest()
+    if isinstance(value, (list, tuple)):
+        return f'{type(value).__qualname__}[' + ', '.join(_fingerprint(item, index) for item in value) + ']'
+    if isinstance(value, dict):
+        items = sorted(f'{_fingerprint(key, index)}: {_fingerprint(item, index)}' for key, item in value.items())
+        return '{' + ', '.join(items) + '}'
+    if isinstance(value, (set, frozenset)):
+        return '{' + ', '.join(sorted(_fingerprint(item, index) for item in value)) + '}'
+    if callable(value) and hasattr(value, '__code__'):
+        return _function_identity(value)
+    try:
+        return hashlib.sha256(pickle.dumps(value, protocol=4)).hexdigest()
+    except Exception as error:
+        raise TypeError(f'{type(value).__qualname__} arguments can\'t be described in a cache key') from error
+
+
+# whether a value holds a table, whose row at the index then tells the samples apart
+def _pins_row(value):
+    if hasattr(value, 'iloc') and hasattr(value, 'columns'):
+        return True
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return any(_pins_row(item) for item in value)
+    if isinstance(value, dict):
+        return any(_pins_row(item) for item in value.values())
+    return False
+
+
+# hash of a code object. the code objects nested in it, e.g. of comprehensions, lambdas and inner
+# functions, are hashed the same way, as their repr holds their memory address
+def _code_hash(code):
+    digest = hashlib.sha256(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            digest.update(_code_hash(const).encode())
+        elif isinstance(const, frozenset):
+            digest.update(repr(sorted(repr(item) for item in const)).encode())
+        else:
+            digest.update(repr(const).encode())
+    return digest.hexdigest()
+
+
+# identity of a function for cache keys: its qualified name and, by default, its bytecode. served
+# scripts run as a new bokeh_app_<id> module in every session, so their functions go by name only
+def _function_identity(func, version=None):
+    module = getattr(func, '__module__', None) or ''
+    if module.startswith('bokeh_app_'):
+        module = ''
+    identity = f'{module}.{getattr(func, "__qualname__", repr(func))}'
+    if version is None:
+        code = getattr(func, '__code__', None)
+        version = _code_hash(code) if code else ''
+    return f'{identity}:{version}'
+
+
+def result_key(func, args, index, version=None):
+    """
+    Key of func(index, *args) in a DiskCache: a hash of the function identity and version
+    and of the values the call depends on, so identical samples share one result. Without a
+    table among the arguments, the index itself is part of the key. Raises TypeError if an
+    argument can't be described.
+    """
+    parts = [_function_identity(func, version)] + [_fingerprint(arg, index) for arg in args]
+    if not any(_pins_row(arg) for arg in args):
+        parts.append(f'index {index}')
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
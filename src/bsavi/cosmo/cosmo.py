@@ -1,56 +1,133 @@
+import atexit
 import pandas as pd
 import numpy as np
 from classy import Class
-from multiprocessing import Pool
+from threading import Lock
+from multiprocessing import Pool, current_process
+from ..cache import PlotCache
 
-# run class on the user's selection with default settings
-def run_class(index, sample):
+# settings used for every CLASS run
+_class_settings = {'output':'mPk, tCl, pCl, lCl','P_k_max_1/Mpc':3.0, 'lensing':'yes'}
+
+# the CLASS instance kept warm by this process, reused for every run through struct_cleanup
+_cosmo = None
+
+# persistent pool of CLASS workers, created on first use and shared by every call in this process.
+# callbacks of several sessions ask for it at the same time, so it is started under a lock
+_pool = None
+_pool_lock = Lock()
+
+# LambdaCDM spectra already computed, keyed by their input parameters
+_baselines = PlotCache(max_entries=256)
+
+
+def _warm_class():
+    global _cosmo
+    if _cosmo is None:
+        _cosmo = Class()
+    return _cosmo
+
+
+# the parameters of one row of the sample, as a dict CLASS accepts
+def _row_params(index, sample):
     selection = sample.iloc[[index]].to_dict('index')
+    return next(iter(selection.values()))
+
+
+# P(k) at z=0 over the whole grid in one call. older versions of classy lack get_pk_array
+def _linear_pk(cosmo, k):
+    if hasattr(cosmo, 'get_pk_array'):
+        return np.asarray(cosmo.get_pk_array(k, np.array([0.]), len(k), 1, 0))
+    return np.array([cosmo.pk(ki, 0.) for ki in k])
+
+
+# run CLASS on a dict of parameters with the warm instance of this process
+def _compute_spectra(params):
+    cosmo = _warm_class()
+    try:
+        cosmo.set(params)
+        cosmo.set(_class_settings)
+        cosmo.compute()
+
+        # set variables for matter power spectrum and lensed CMB angular power spectra
+        kk = np.logspace(-4,np.log10(3),1000)
+        h = cosmo.h()
+        Pk = _linear_pk(cosmo, kk*h)*h**3
+        l = np.array(range(2,2501))
+        factor = l*(l+1)/(2*np.pi)
+        lensed_cl = cosmo.lensed_cl(2500)
+    finally:
+        # free the computed structures and reset the inputs so the instance can be reused.
+        # cleanups requried for backwards compat w CLASS 2.x
+        cosmo.struct_cleanup()
+        cosmo.empty()
 
-    cosmo = Class()
-    cosmo.set(selection[index])
-    cosmo.set({'output':'mPk, tCl, pCl, lCl','P_k_max_1/Mpc':3.0, 'lensing':'yes'})
-    cosmo.compute()
-
-    # set variables for matter power spectrum and lensed CMB angular power spectra
-    kk = np.logspace(-4,np.log10(3),1000)
-    Pk = []
-    h = cosmo.h()
-    for k in kk:
-        Pk.append(cosmo.pk(k*h,0.)*h**3)
-    Pk = np.array(Pk)
-    l = np.array(range(2,2501))
-    factor = l*(l+1)/(2*np.pi)
-    lensed_cl = cosmo.lensed_cl(2500)
-    
     results = [
         {'k': kk, 'Pk': Pk},
         {'l': l, 'Cl_tt': factor*lensed_cl['tt'][2:]},
-        {'l': l, 'Cl_ee': factor*lensed_cl['ee'][2:]}, 
+        {'l': l, 'Cl_ee': factor*lensed_cl['ee'][2:]},
     ]
-    # cleanups requried for backwards compat w CLASS 2.x
-    cosmo.struct_cleanup()
-    cosmo.empty()
     return results
 
-# calculate percentage difference between model of interest and LambdaCDM model
-def compute_residuals(index, sample, sample_CDM):
-    if __name__ == '__main__':
-        with Pool() as p:
-            [mycosmo, LambdaCDM] = p.starmap(run_class, [(index, sample), (index, sample_CDM)])
+
+def get_pool(max_workers=None):
+    """
+    Return the persistent pool of CLASS workers, starting it on first use with max_workers
+    processes (2 by default, the runs of one residual). Each worker keeps its own CLASS
+    instance warm across calls. The first call sizes the pool; close_pool to resize it.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = Pool(max_workers or 2)
+            atexit.register(close_pool)
+        return _pool
+
+
+def close_pool():
+    """Shut down the persistent pool of CLASS workers."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+# run class on the user's selection with default settings
+def run_class(index, sample):
+    return _compute_spectra(_row_params(index, sample))
+
+# calculate percentage difference between model of interest and LambdaCDM model. max_workers
+# sizes the pool of CLASS workers when this call starts it
+def compute_residuals(index, sample, sample_CDM, max_workers=None):
+    params = _row_params(index, sample)
+    params_CDM = _row_params(index, sample_CDM)
+    key = tuple(sorted(params_CDM.items()))
+    LambdaCDM = _baselines.get(key)
+    # daemonic processes (e.g. the workers themselves) can't have children: run in place
+    if current_process().daemon:
+        mycosmo = _compute_spectra(params)
+        if LambdaCDM is None:
+            LambdaCDM = _compute_spectra(params_CDM)
     else:
-        mycosmo = run_class(index, sample)
-        LambdaCDM = run_class(index, sample_CDM)
+        pool = get_pool(max_workers)
+        model_run = pool.apply_async(_compute_spectra, (params,))
+        CDM_run = pool.apply_async(_compute_spectra, (params_CDM,)) if LambdaCDM is None else None
+        mycosmo = model_run.get()
+        if CDM_run is not None:
+            LambdaCDM = CDM_run.get()
+    _baselines.put(key, LambdaCDM)
 
     myPk, myCl_tt, myCl_ee = mycosmo
     LCDM_Pk, LCDM_Cl_tt, LCDM_Cl_ee = LambdaCDM
     pk_residuals = (myPk['Pk'] - LCDM_Pk['Pk'])/LCDM_Pk['Pk']*100
     cl_tt_residuals = (myCl_tt['Cl_tt'] - LCDM_Cl_tt['Cl_tt'])/LCDM_Cl_tt['Cl_tt']*100
     cl_ee_residuals = (myCl_ee['Cl_ee'] - LCDM_Cl_ee['Cl_ee'])/LCDM_Cl_ee['Cl_ee']*100
-    
+
     residuals = [
-        {'k': myPk['k'], 'pk_residuals': pk_residuals}, 
-        {'l': myCl_tt['l'], 'cl_tt_residuals': cl_tt_residuals}, 
+        {'k': myPk['k'], 'pk_residuals': pk_residuals},
+        {'l': myCl_tt['l'], 'cl_tt_residuals': cl_tt_residuals},
         {'l': myCl_ee['l'], 'cl_ee_residuals': cl_ee_residuals},
     ]
-    return residuals
\ No newline at end of file
+    return residuals
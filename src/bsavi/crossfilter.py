@@ -0,0 +1,254 @@
+import numpy as np
+import holoviews as hv
+import panel as pn
+from holoviews import streams
+from .loaders.subsample import _column_values
+
+# linked brushing across every pair of parameters, backed by sorted column indexes and a bitmask per sample
+
+
+# the positions of [start, stop) that are outside of [other_start, other_stop), as at most two slices
+def _outside(start, stop, other_start, other_stop):
+    pieces = [(start, min(stop, other_start)), (max(start, other_stop), stop)]
+    return [slice(a, b) for a, b in pieces if a < b]
+
+
+class CrossFilter:
+    """
+    Combined range filters over the columns of the samples.
+
+    Each column is argsorted once, on its first filter, so a range is resolved into a span of
+    the sorted order with two binary searches. Every sample holds a bitmask with one bit per
+    filtered column, set while the sample is outside of that column's range, and moving a
+    range only flips the bits of the samples between its old and new ends. A sample passes
+    when its bitmask is zero, and the samples passing every filter but those of some columns
+    come from masking their bits out. Up to 64 columns can be filtered at the same time.
+
+    Parameters
+    ----------
+    data: Pandas DataFrame or ChainDataset
+        the samples
+
+    columns: list of strings
+        columns that can be filtered. all of them by default
+    """
+    def __init__(self, data, columns: list = None):
+        self.data = data
+        self.columns = list(data.columns if columns is None else columns)
+        self.length = len(data)
+        self._bits = np.zeros(self.length, dtype=np.uint64)
+        self._values = {}
+        self._sorted = {}
+        # column -> (bit, start, stop) of its range in the sorted order
+        self._filters = {}
+
+    def values(self, column: str):
+        """The values of a column as a float array, read once."""
+        if column not in self._values:
+            if column not in self.columns:
+                raise KeyError(f"'{column}' is not one of the filtered columns {self.columns}")
+            self._values[column] = _column_values(self.data, column, self.length)
+        return self._values[column]
+
+    def _order(self, column):
+        if column not in self._sorted:
+            values = self.values(column)
+            # non-finite values sort last and never fall inside a range
+            order = np.argsort(values, kind='stable')
+            self._sorted[column] = (order, values[order])
+        return self._sorted[column]
+
+    def _flip(self, order, pieces, bit, set_bit):
+        for piece in pieces:
+            rows = order[piece]
+            if set_bit:
+                self._bits[rows] |= bit
+            else:
+                self._bits[rows] &= ~bit
+
+    def filter(self, column: str, bounds=None):
+        """
+        Keep the samples whose value of the column lies within bounds=(low, high), ends
+        included. None removes the filter of the column.
+        """
+        order, values = self._order(column)
+        if column in self._filters:
+            bit, start, stop = self._filters[column]
+        else:
+            if bounds is None:
+                return
+            used = [bit for bit, _, _ in self._filters.values()]
+            free = [np.uint64(1) << np.uint64(i) for i in range(64) if np.uint64(1) << np.uint64(i) not in used]
+            if not free:
+                raise ValueError('at most 64 columns can be filtered at the same time')
+            bit, start, stop = free[0], 0, self.length
+        if bounds is None:
+            self._flip(order, _outside(0, self.length, start, stop), bit, set_bit=False)
+            del self._filters[column]
+            return
+        low, high = sorted(bounds)
+        new_start = int(np.searchsorted(values, low, side='left'))
+        new_stop = int(np.searchsorted(values, high, side='right'))
+        # samples entering the range lose the bit, samples leaving it get it
+        self._flip(order, _outside(new_start, new_stop, start, stop), bit, set_bit=False)
+        self._flip(order, _outside(start, stop, new_start, new_stop), bit, set_bit=True)
+        self._filters[column] = (bit, new_start, new_stop)
+
+    def clear(self):
+        """Remove every filter."""
+        self._bits[:] = 0
+        self._filters.clear()
+
+    @property
+    def filters(self):
+        """The filtered columns and their ranges, as a dict of column -> (low, high)."""
+        ranges = {}
+        for column, (_, start, stop) in self._filters.items():
+            _, values = self._sorted[column]
+            ranges[column] = (values[start], values[stop - 1]) if stop > start else (np.nan, np.nan)
+        return ranges
+
+    def mask(self, exclude: list = ()):
+        """Boolean mask of the samples passing every filter except those of the excluded columns."""
+        bits = np.uint64(0)
+        for column in exclude:
+            if column in self._filters:
+                bits |= self._filters[column][0]
+        if not bits:
+            return self._bits == 0
+        return (self._bits & ~bits) == 0
+
+    def index(self, exclude: list = ()):
+        """Positions of the samples passing every filter except those of the excluded columns."""
+        return np.flatnonzero(self.mask(exclude))
+
+
+class ScatterMatrix:
+    """
+    Panels of every pair of the given columns, linked by brushing.
+
+    Drawing a box in a panel filters the samples to the ranges it spans on both columns, and
+    every panel then highlights the samples passing the filters of the other columns over
+    all samples in grey. With rasterize=True the panels are 2D histograms whose bins are
+    computed once per pair, so a brush over millions of samples is a bincount per panel.
+
+    Parameters
+    ----------
+    data: Pandas DataFrame or ChainDataset
+        the samples
+
+    columns: list of strings
+        the columns to cross. every pair gets a panel
+
+    rasterize: bool
+        draw 2D histograms instead of points
+
+    labels: dict
+        axis label of each column. the column name by default
+
+    bins: int
+        number of histogram bins along each axis when rasterized
+
+    size: int
+        width and height of each panel in pixels
+    """
+    def __init__(self, data, columns: list, rasterize: bool = False, labels: dict = None,
+                 bins: int = 200, size: int = 250):
+        if len(columns) < 2:
+            raise ValueError('a scatter matrix needs at least two columns')
+        self.filter = CrossFilter(data, columns)
+        self.columns = list(columns)
+        self.rasterize = rasterize
+        self.labels = labels or {}
+        self.bins = bins
+        self.size = size
+        self._callbacks = []
+        self._cells = {}
+        self.changed = streams.Counter()
+        self.status = pn.pane.Str(f'{self.filter.length} samples', width=250, align='center')
+        self.clear_button = pn.widgets.Button(name='Clear filters', width=120)
+        self.clear_button.on_click(lambda event: self.clear())
+        pairs = [(a, b) for i, a in enumerate(self.columns) for b in self.columns[i + 1:]]
+        self.panel = pn.Column(
+            pn.GridBox(*[self._pair(a, b) for a, b in pairs], ncols=min(len(pairs), 3)),
+            pn.Row(self.clear_button, self.status)
+        )
+
+    def on_change(self, callback):
+        """Call callback(index) with the positions of the samples passing every filter after each brush."""
+        self._callbacks.append(callback)
+
+    def brush(self, x_column: str, y_column: str, bounds):
+        """Filter the two columns to the box (x0, y0, x1, y1). None removes their filters."""
+        if bounds is None:
+            self.filter.filter(x_column, None)
+            self.filter.filter(y_column, None)
+        else:
+            x0, y0, x1, y1 = bounds
+            self.filter.filter(x_column, (x0, x1))
+            self.filter.filter(y_column, (y0, y1))
+        self._changed()
+
+    def clear(self):
+        """Remove every filter."""
+        self.filter.clear()
+        self._changed()
+
+    def _changed(self):
+        index = self.filter.index() if self.filter.filters else np.array([], dtype=np.intp)
+        if self.filter.filters:
+            self.status.object = f'{len(index)} of {self.filter.length} samples'
+        else:
+            self.status.object = f'{self.filter.length} samples'
+        self.changed.event()
+        for callback in self._callbacks:
+            callback(index.tolist())
+
+    def _options(self, a, b):
+        return dict(width=self.size, height=self.size, xlabel=self.labels.get(a, a), ylabel=self.labels.get(b, b),
+                    tools=['box_select'], active_tools=['box_select'], toolbar='above', framewise=False)
+
+    # histogram bin of every sample for a pair of columns, computed once
+    def _binned(self, a, b):
+        if (a, b) not in self._cells:
+            x, y = self.filter.values(a), self.filter.values(b)
+            finite = np.isfinite(x) & np.isfinite(y)
+            edges = [np.linspace(*self._extent(v[finite]), self.bins + 1) for v in (x, y)]
+            ix = np.clip(np.searchsorted(edges[0], x, side='right') - 1, 0, self.bins - 1)
+            iy = np.clip(np.searchsorted(edges[1], y, side='right') - 1, 0, self.bins - 1)
+            cells = np.where(finite, iy * self.bins + ix, self.bins * self.bins).astype(np.int32)
+            centers = [0.5 * (edge[1:] + edge[:-1]) for edge in edges]
+            self._cells[(a, b)] = (cells, centers)
+        return self._cells[(a, b)]
+
+    @staticmethod
+    def _extent(values):
+        if values.size == 0:
+            return 0.0, 1.0
+        low, high = values.min(), values.max()
+        return (low, high) if high > low else (low - 0.5, high + 0.5)
+
+    def _image(self, a, b, mask, **options):
+        cells, (x, y) = self._binned(a, b)
+        selected = cells if mask is None else cells[mask]
+        counts = np.bincount(selected, minlength=self.bins * self.bins + 1)[:-1].astype(float)
+        counts[counts == 0] = np.nan
+        return hv.Image((x, y, counts.reshape(self.bins, self.bins)), kdims=[a, b], vdims=['count']).opts(**options)
+
+    def _pair(self, a, b):
+        options = self._options(a, b)
+        if self.rasterize:
+            background = self._image(a, b, None, cmap=['#dddddd'], **options)
+            def draw(counter):
+                return self._image(a, b, self.filter.mask(exclude=[a, b]), cmap='Spectral_r', cnorm='eq_hist', **options)
+        else:
+            x, y = self.filter.values(a), self.filter.values(b)
+            background = hv.Points((x, y), kdims=[a, b]).opts(color='#dddddd', size=3, **options)
+            def draw(counter):
+                mask = self.filter.mask(exclude=[a, b])
+                return hv.Points((x[mask], y[mask]), kdims=[a, b]).opts(color='#3288bd', size=3, **options)
+        highlighted = hv.DynamicMap(draw, streams=[self.changed])
+        plot = background * highlighted
+        box = streams.BoundsXY(source=plot)
+        box.add_subscriber(lambda bounds: self.brush(a, b, bounds))
+        return pn.panel(plot)
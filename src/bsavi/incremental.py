@@ -0,0 +1,140 @@
+import numpy as np
+import holoviews as hv
+import panel as pn
+from bokeh.core.properties import field
+from bokeh.palettes import Category20
+from bokeh.models import LogScale
+
+# observable panels that follow the selection by sending only what changed to the browser
+
+
+class IncrementalCurves:
+    """
+    Panel showing the curves of one observable at the selected indexes, updated by diff.
+
+    HoloViews renders the (empty, styled) plot once. Afterwards, curves of newly selected
+    indexes are written into the slots freed by deselected ones through
+    ColumnDataSource.patch, or appended through ColumnDataSource.stream when no slot is
+    free, so the traffic of an update depends on how much the selection changed rather
+    than on its size. Each index keeps the same color while it is shown.
+
+    Parameters
+    ----------
+    observable: Observable or LiveObservable
+        the observable the curves belong to
+
+    i: int
+        position of the curves in the observable
+    """
+    def __init__(self, observable, i):
+        self.observable = observable
+        self.i = i
+        self.name = observable.name[i]
+        # the index shown in each slot of the data source (None when free), and its curve
+        self._slots = []
+        self._lines = []
+        # data sources and figures of every view of the plot, attached when rendered
+        self._views = []
+        self._element = None
+        placeholder = hv.Curve(np.random.rand(0, 2)).opts(
+            title=f'{self.name} - No Selection', height=400, width=500, fontscale=1.1, framewise=True)
+        self.pane = pn.pane.HoloViews(placeholder)
+
+    # the styled, empty plot, built once the names of the dimensions are known
+    def _build(self, kdim, vdim):
+        plot = hv.Contours([], kdims=[kdim, vdim], vdims=['index', 'color'])
+        plot.opts(**self.observable._default_opts(self.i, kdim, vdim), tools=['hover'], hooks=[self._attach])
+        self.observable._apply_compatible_opts(plot, self.i)
+        return plot
+
+    # take over the data source of a freshly rendered view and fill it with the current slots
+    def _attach(self, plot, element):
+        source = plot.handles['source']
+        renderer = plot.handles['glyph_renderer']
+        for glyph in (renderer.glyph, renderer.selection_glyph, renderer.nonselection_glyph,
+                      renderer.hover_glyph, renderer.muted_glyph):
+            if glyph is not None:
+                glyph.line_color = field('color')
+        source.data = self._columns(range(len(self._slots)))
+        self._views = [view for view in self._views if view[0] is not source] + [(source, plot.state)]
+        self._update_ranges()
+
+    def _columns(self, slots):
+        columns = {'xs': [], 'ys': [], 'index': [], 'color': []}
+        for slot in slots:
+            n = self._slots[slot]
+            x, y = self._lines[slot]
+            columns['xs'].append(x)
+            columns['ys'].append(y)
+            columns['index'].append(-1 if n is None else n)
+            columns['color'].append(Category20[20][0] if n is None else Category20[20][n % 20])
+        return columns
+
+    def update(self, data: dict):
+        """
+        Show the curves of the given indexes, as a dict of index -> {kdim: array, vdim: array}.
+        Only the indexes that were added or removed since the last update are sent.
+        """
+        if data and self._element is None:
+            kdim, vdim = next(iter(data.values())).keys()
+            self._element = self._build(kdim, vdim)
+            self.pane.object = self._element
+        shown = {n: slot for slot, n in enumerate(self._slots) if n is not None}
+        removed = [slot for n, slot in shown.items() if n not in data]
+        added = [n for n in data if n not in shown]
+        if not removed and not added:
+            return
+        empty = np.array([])
+        for slot in removed:
+            self._slots[slot] = None
+            self._lines[slot] = (empty, empty)
+        free = [slot for slot, n in enumerate(self._slots) if n is None]
+        changed = []
+        appended = []
+        for n in added:
+            kdim, vdim = data[n].keys()
+            line = (np.asarray(data[n][kdim]), np.asarray(data[n][vdim]))
+            if free:
+                slot = free.pop(0)
+                self._slots[slot] = n
+                self._lines[slot] = line
+                changed.append(slot)
+            else:
+                self._slots.append(n)
+                self._lines.append(line)
+                appended.append(len(self._slots) - 1)
+        # slots freed and not reused are emptied in place
+        changed += [slot for slot in removed if self._slots[slot] is None]
+        patches = self._columns(changed)
+        new_rows = self._columns(appended)
+        for source, _ in self._views:
+            if changed:
+                source.patch({key: list(zip(changed, values)) for key, values in patches.items()})
+            if appended:
+                source.stream(new_rows)
+        self._update_ranges()
+
+    # the ranges are set by HoloViews when the plot is rendered: follow the curves shown since
+    def _update_ranges(self):
+        lines = [line for n, line in zip(self._slots, self._lines) if n is not None]
+        if not lines:
+            return
+        for _, figure in self._views:
+            for values, axis_range, scale in ((0, figure.x_range, figure.x_scale), (1, figure.y_range, figure.y_scale)):
+                points = np.concatenate([line[values] for line in lines]).astype(float)
+                log = isinstance(scale, LogScale)
+                points = points[np.isfinite(points) & (points > 0)] if log else points[np.isfinite(points)]
+                if points.size == 0:
+                    continue
+                low, high = points.min(), points.max()
+                if log:
+                    low, high = np.log10(low), np.log10(high)
+                pad = 0.05 * (high - low) if high > low else 0.5
+                low, high = low - pad, high + pad
+                if log:
+                    low, high = 10**low, 10**high
+                if hasattr(axis_range, 'start'):
+                    # keep inverted axes inverted
+                    if axis_range.start is not None and axis_range.end is not None and axis_range.start > axis_range.end:
+                        low, high = high, low
+                    axis_range.start, axis_range.end = low, high
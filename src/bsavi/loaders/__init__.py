@@ -1 +1,4 @@
-from .loaders import *
\ No newline at end of file
+from .loaders import *
+from .dataset import *
+from .subsample import *
+from .follow import *
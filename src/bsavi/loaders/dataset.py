@@ -0,0 +1,137 @@
+import pandas as pd
+import numpy as np
+from .loaders import ChainCache, _resolve_paths
+
+
+class ChainDataset:
+    """
+    Out-of-core view of a set of chain files.
+
+    The chains are parsed once into a ChainCache and read back through memory-mapped,
+    column-major blocks (one per chain file). Only the columns and rows that are asked
+    for are ever read, so the resident footprint stays bounded however large the run is.
+    Supports the parts of the DataFrame interface used by viz and the observables:
+    ``columns``, ``len()``, ``dataset[column]``, ``dataset[[columns]]`` and ``dataset.iloc``.
+
+    Parameters
+    ----------
+    path: string or list of strings
+        name of the chain file, list of names, or glob pattern
+
+    params: list of strings
+        parameter names used as column names
+
+    cache_dir: string
+        directory of the ChainCache holding the parsed blocks
+
+    params_only: bool
+        whether to hide the weight and -LogLkl columns
+
+    dtype: numpy dtype
+        precision of the stored values. float32 halves the size of the cache
+
+    parallel: bool
+        whether to parse uncached chain files at the same time
+
+    max_workers: int
+        number of threads used when parallel is True
+    """
+    def __init__(
+        self,
+        path,
+        params: list,
+        cache_dir: str,
+        params_only: bool = True,
+        dtype=np.float64,
+        parallel: bool = False,
+        max_workers: int = None
+    ):
+        self.files = _resolve_paths(path)
+        self._blocks = ChainCache(cache_dir, dtype).load(self.files, parallel, max_workers)
+        self._first = 2 if params_only else 0
+        self.columns = pd.Index((['weight', '-LogLkl'] + list(params))[self._first:])
+        self._offsets = np.cumsum([0] + [len(block) for block in self._blocks])
+        self.dtype = np.dtype(dtype)
+        self.iloc = _ILocIndexer(self)
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    @property
+    def shape(self):
+        return (len(self), len(self.columns))
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return pd.Series(self._read(slice(None), [key])[:, 0], name=key)
+        return self.iloc[:, [self.columns.get_loc(column) for column in key]]
+
+    def __repr__(self):
+        return f'ChainDataset({len(self)} rows x {len(self.columns)} columns, {len(self._blocks)} files)'
+
+    def column(self, name: str, rows=None):
+        """Return the values of one column as a numpy array, optionally at the given row positions."""
+        return self._read(slice(None) if rows is None else rows, [name])[:, 0]
+
+    def to_frame(self, columns: list = None):
+        """Materialize the dataset, or only the given columns, as an in-memory DataFrame."""
+        if columns is None:
+            columns = list(self.columns)
+        return self[columns]
+
+    # read the given rows (slice or positions) of the named columns into a new array
+    def _read(self, rows, columns):
+        positions = [self.columns.get_loc(column) + self._first for column in columns]
+        if isinstance(rows, slice):
+            start, stop, step = rows.indices(len(self))
+            if step == 1:
+                parts = []
+                for block, offset, end in zip(self._blocks, self._offsets[:-1], self._offsets[1:]):
+                    lo, hi = max(start, offset), min(stop, end)
+                    if lo < hi:
+                        parts.append(block[lo - offset:hi - offset, positions])
+                if not parts:
+                    return np.empty((0, len(positions)), dtype=self.dtype)
+                return np.concatenate(parts)
+            rows = np.arange(start, stop, step)
+        rows = np.asarray(rows, dtype=np.intp)
+        if rows.size and (rows.min() < -len(self) or rows.max() >= len(self)):
+            raise IndexError(f'row positions out of bounds for ChainDataset of length {len(self)}')
+        rows = np.where(rows < 0, rows + len(self), rows)
+        out = np.empty((len(rows), len(positions)), dtype=self.dtype)
+        block_ids = np.searchsorted(self._offsets, rows, side='right') - 1
+        for b in np.unique(block_ids):
+            mask = block_ids == b
+            out[mask] = self._blocks[b][np.ix_(rows[mask] - self._offsets[b], positions)]
+        return out
+
+
+# positional indexing into a ChainDataset, returning pandas objects like DataFrame.iloc
+class _ILocIndexer:
+    def __init__(self, dataset):
+        self._dataset = dataset
+
+    def __getitem__(self, key):
+        rows, cols = key if isinstance(key, tuple) else (key, slice(None))
+        columns = self._dataset.columns[cols]
+        scalar_col = isinstance(columns, str)
+        if scalar_col:
+            columns = [columns]
+        else:
+            columns = list(columns)
+        if np.isscalar(rows):
+            values = self._dataset._read([rows], columns)[0]
+            if scalar_col:
+                return values[0]
+            return pd.Series(values, index=columns, name=rows)
+        if isinstance(rows, slice):
+            index = pd.RangeIndex(len(self._dataset))[rows]
+        else:
+            rows = np.asarray(rows)
+            if rows.dtype == bool:
+                rows = np.flatnonzero(rows)
+            index = np.where(rows < 0, rows + len(self._dataset), rows)
+        values = self._dataset._read(rows, columns)
+        if scalar_col:
+            return pd.Series(values[:, 0], index=index, name=columns[0])
+        return pd.DataFrame(values, index=index, columns=columns)
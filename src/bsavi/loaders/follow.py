@@ -0,0 +1,80 @@
+import io
+import os
+import warnings
+import pandas as pd
+import numpy as np
+from .loaders import _resolve_paths
+
+
+class ChainFollower:
+    """
+    Incremental reader of chain files that are still being written.
+
+    Remembers how far each file has been read and, on every poll, parses only the complete
+    lines appended since, so following a run costs as much as the new samples. Files that
+    appear under the glob pattern are picked up from their first line. Rows are numbered in
+    the order they are read and never move, so positions stay valid as the chains grow.
+
+    Parameters
+    ----------
+    path: string or list of strings
+        glob pattern of the chain files, or a list of names
+
+    params: list of strings
+        parameter names used as column names
+
+    params_only: bool
+        whether to leave out the weight and -LogLkl columns
+
+    columns: list of strings
+        columns to keep, among weight, -LogLkl and params. overrides params_only
+    """
+    def __init__(self, path, params: list, params_only: bool = True, columns: list = None):
+        self.path = path
+        all_columns = ['weight', '-LogLkl'] + list(params)
+        if columns is None:
+            columns = list(params) if params_only else all_columns
+        self.columns = list(columns)
+        self._usecols = [all_columns.index(column) for column in self.columns]
+        # bytes of each file parsed so far, always at the end of a line
+        self.offsets = {}
+        self.rows = 0
+
+    @property
+    def files(self):
+        return list(self.offsets)
+
+    def _read_new(self, filename):
+        offset = self.offsets.setdefault(filename, 0)
+        size = os.path.getsize(filename)
+        if size < offset:
+            warnings.warn(f'{filename} shrank from {offset} to {size} bytes since it was last read; '
+                          'only lines appended from now on are read')
+            self.offsets[filename] = size
+            return None
+        if size == offset:
+            return None
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            block = f.read(size - offset)
+        # a line still being written is left for the next poll
+        cut = block.rfind(b'\n') + 1
+        self.offsets[filename] = offset + cut
+        if not block[:cut].strip():
+            return None
+        return np.loadtxt(io.BytesIO(block[:cut]), usecols=self._usecols, ndmin=2)
+
+    def poll(self):
+        """
+        Return the rows appended to the chain files since the last poll, and the rows of
+        new files, as a DataFrame indexed by their positions among all rows read.
+        """
+        chunks = []
+        for filename in _resolve_paths(self.path):
+            chunk = self._read_new(filename)
+            if chunk is not None and len(chunk):
+                chunks.append(chunk)
+        values = np.concatenate(chunks) if chunks else np.empty((0, len(self.columns)))
+        frame = pd.DataFrame(values, columns=self.columns, index=pd.RangeIndex(self.rows, self.rows + len(values)))
+        self.rows += len(values)
+        return frame
@@ -1,7 +1,13 @@
+import io
+import os
+import re
+import json
+import hashlib
 import pandas as pd
 import numpy as np
 from glob import glob, iglob
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # methods to process data products from the CLASS cosmology code.
 
@@ -16,17 +22,273 @@ def load_params(filename):
             params_list.append(text_latex_pair)
     return dict(params_list)
 
-# create a DataFrame from the chain files and use a list of parameters as the column names
-def load_chains(path, params, params_only=True):
+
+# lines the parsers skip: blank lines and '#' comments, possibly indented
+_skipped_line = re.compile(rb'^[ \t\r\x0b\x0c]*(?:#|\n)', re.M)
+_unusual_line = re.compile(rb'\n[ \t\r\x0b\x0c]*\n|\n[ \t\r\x0b\x0c]+#')
+_whole_skipped_line = re.compile(rb'^[ \t\r\x0b\x0c]*(?:#[^\n]*)?(?:\n|\Z)', re.M)
+
+
+# number of samples in a chain file, as the parsers see them. counts newlines in large
+# binary blocks cut at line ends and discounts the '#' comment lines MontePython writes
+# mid-chain. blank and indented comment lines are only looked for when there are some
+def _count_rows(filename, blocksize=1 << 24):
+    rows = 0
+    tail = b''
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            lines = tail + block
+            if block:
+                cut = lines.rfind(b'\n') + 1
+                lines, tail = lines[:cut], lines[cut:]
+            elif lines and not lines.endswith(b'\n'):
+                lines += b'\n'
+            if lines[:1].isspace() or _unusual_line.search(lines):
+                rows += lines.count(b'\n') - len(_skipped_line.findall(lines))
+            else:
+                rows += lines.count(b'\n') - lines.count(b'\n#') - (lines[:1] == b'#')
+            if not block:
+                break
+    return rows
+
+
+# number of columns in the first data line of a chain file
+def _count_columns(filename):
+    with open(filename, 'r') as f:
+        for line in f:
+            if line.strip() and not line.lstrip().startswith('#'):
+                return len(line.split())
+    raise ValueError(f'{filename} contains no chain samples')
+
+
+# remove the lines the parsers skip from a block of lines, for the pandas parser, which reads
+# an indented comment as a row of NaN. blocks without blank or indented comment lines are kept
+def _drop_skipped(lines):
+    if lines[:1].isspace() or _unusual_line.search(lines):
+        return _whole_skipped_line.sub(b'', lines)
+    return lines
+
+
+# stream the sample lines of a chain file in large blocks, dropping comments, the first
+# `skip` samples and all but every `thin`-th sample after that, before anything is converted
+def _iter_lines(filename, skip=0, thin=1, blocksize=1 << 24):
+    seen = 0
+    tail = b''
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if skip == 0 and thin == 1:
+                # nothing to drop: hand over whole lines and let the parser skip the comments
+                buffer = tail + block
+                cut = buffer.rfind(b'\n') + 1 if block else len(buffer)
+                lines, tail = buffer[:cut], buffer[cut:]
+                if lines.strip():
+                    yield lines
+                if not block:
+                    break
+                continue
+            lines = (tail + block).split(b'\n')
+            tail = lines.pop() if block else b''
+            samples = [line for line in lines if line.strip() and not line.lstrip().startswith(b'#')]
+            first = max(skip - seen, 0)
+            first += (skip - seen - first) % thin
+            kept = samples[first::thin]
+            seen += len(samples)
+            if kept:
+                yield b'\n'.join(kept)
+            if not block:
+                break
+
+
+# parse a chain file in chunks, writing each chunk directly into the given slice of the
+# preallocated output array. `usecols` are the column positions to keep; the other columns
+# are never converted. the numpy parser is the fastest on one core, while the pandas C
+# parser releases the GIL and so is used when several files are parsed on threads. both
+# read the blocks of _iter_lines, so they keep the same samples as _count_rows counts
+def _parse_into(filename, out, usecols=None, skip=0, thin=1, engine='numpy'):
+    if engine == 'numpy':
+        chunks = (np.loadtxt(io.BytesIO(lines), usecols=usecols, ndmin=2)
+                  for lines in _iter_lines(filename, skip, thin))
+    else:
+        read_opts = dict(sep=r'\s+', header=None, comment='#', engine='c', usecols=usecols)
+        blocks = (_drop_skipped(lines) for lines in _iter_lines(filename, skip, thin))
+        frames = (pd.read_csv(io.BytesIO(lines), **read_opts) for lines in blocks if lines.strip())
+        chunks = (frame.to_numpy() if usecols is None else frame[usecols].to_numpy() for frame in frames)
+    pos = 0
+    for chunk in chunks:
+        if chunk.shape[1] != out.shape[1]:
+            raise ValueError(f'{filename} has {chunk.shape[1]} columns, expected {out.shape[1]}')
+        out[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    return pos
+
+
+# number of samples left in a file of `rows` samples after burn-in removal and thinning
+def _kept_rows(rows, burn_in, thin):
+    skip = int(burn_in * rows)
+    return skip, (rows - skip + thin - 1) // thin
+
+
+# parse the files on a pool of threads into one preallocated array, keeping file order
+def _load_preallocated(file_list, usecols=None, burn_in=0.0, thin=1, max_workers=None):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        counts = list(executor.map(_count_rows, file_list))
+        skips, counts = zip(*[_kept_rows(rows, burn_in, thin) for rows in counts])
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        ncols = len(usecols) if usecols is not None else _count_columns(file_list[0])
+        chains = np.empty((offsets[-1], ncols))
+        engine = 'numpy' if max_workers == 1 else 'pandas'
+        futures = {
+            executor.submit(_parse_into, filename, chains[offsets[i]:offsets[i + 1]], usecols, skips[i], thin, engine): i
+            for i, filename in enumerate(file_list)
+        }
+        rows = list(counts)
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            rows[futures[future]] = future.result()
+    # a file that changed since it was counted holds fewer rows; shift the parsed blocks down in place
+    if rows != list(counts):
+        pos = 0
+        for i, n in enumerate(rows):
+            chains[pos:pos + n] = chains[offsets[i]:offsets[i] + n]
+            pos += n
+        chains = chains[:pos]
+    return chains
+
+
+class ChainCache:
+    """
+    On-disk cache of parsed chain files.
+
+    Each chain file is stored as a column-major .npy block that is memory-mapped
+    when it is loaded again. A block is only rebuilt when the size or modification
+    time of its source file changes, so adding a chain file to a run parses just that file.
+
+    Parameters
+    ----------
+    directory: string
+        where the blocks and their manifest are kept. created if it does not exist
+
+    dtype: numpy dtype
+        precision of the stored values
+    """
+    def __init__(self, directory, dtype=np.float64):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        os.makedirs(directory, exist_ok=True)
+        self._manifest_path = os.path.join(directory, 'manifest.json')
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_manifest(self, entries):
+        # merge with whatever another process wrote in the meantime, then swap the file in atomically
+        manifest = self._read_manifest()
+        manifest.update(entries)
+        tmp = f'{self._manifest_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path)
+
+    def _fingerprint(self, filename):
+        stat = os.stat(filename)
+        return [stat.st_size, stat.st_mtime_ns, self.dtype.str]
+
+    # blocks of different precisions are kept side by side, so readers of each don't rebuild the other's
+    def _entry(self, filename):
+        return f'{os.path.abspath(filename)}:{self.dtype.str}'
+
+    def _block_path(self, filename):
+        key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f'{key}-{self.dtype.str.lstrip("<>=|")}.npy')
+
+    # parse a chain file straight into a memory-mapped block on disk
+    def _build(self, filename):
+        path = self._block_path(filename)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        rows = _count_rows(filename)
+        block = np.lib.format.open_memmap(tmp, mode='w+', dtype=self.dtype,
+                                          shape=(rows, _count_columns(filename)), fortran_order=True)
+        n = _parse_into(filename, block, engine='pandas')
+        if n != rows:
+            trimmed = np.asfortranarray(block[:n])
+            del block
+            with open(tmp, 'wb') as f:
+                np.save(f, trimmed)
+        else:
+            block.flush()
+            del block
+        os.replace(tmp, path)
+        return path
+
+    def load(self, file_list, parallel=False, max_workers=None):
+        """
+        Return a read-only memory-mapped array for each chain file, in the order given,
+        parsing only the files that are new or have changed since they were cached.
+        """
+        manifest = self._read_manifest()
+        entries = {}
+        for filename in file_list:
+            key = self._entry(filename)
+            fingerprint = self._fingerprint(filename)
+            entry = manifest.get(key)
+            if entry is None or entry['fingerprint'] != fingerprint or not os.path.exists(entry['block']):
+                entries[key] = {'fingerprint': fingerprint, 'block': None}
+        if entries:
+            stale = list(dict.fromkeys(filename for filename in file_list if self._entry(filename) in entries))
+            if parallel:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    blocks = list(tqdm(executor.map(self._build, stale), total=len(stale)))
+            else:
+                blocks = [self._build(filename) for filename in tqdm(stale)]
+            for filename, block in zip(stale, blocks):
+                entries[self._entry(filename)]['block'] = block
+            self._write_manifest(entries)
+            manifest.update(entries)
+        return [np.load(manifest[self._entry(filename)]['block'], mmap_mode='r') for filename in file_list]
+
+
+# expand a glob pattern into a sorted list of chain files. lists are passed through as-is
+def _resolve_paths(path):
     if isinstance(path, list):
-        array_list = [np.loadtxt(filename) for filename in tqdm(path)]
-    else: 
-        file_list = sorted(iglob(path))
-        array_list = [np.loadtxt(filename) for filename in tqdm(file_list)]
-    chains = np.vstack(array_list)
-    columns = ['weight', '-LogLkl'] + params
-    if params_only:
-        df = pd.DataFrame(chains[:, 2:], columns=params)
+        return path
+    return sorted(iglob(path))
+
+
+# create a DataFrame from the chain files and use a list of parameters as the column names.
+# `columns`, `burn_in` and `thin` are applied while parsing, so dropped data is never stored
+def load_chains(
+    path,
+    params,
+    params_only=True,
+    parallel=False,
+    max_workers=None,
+    cache_dir=None,
+    columns=None,
+    burn_in=0.0,
+    thin=1
+):
+    if not 0 <= burn_in < 1:
+        raise ValueError(f'burn_in must be a fraction in [0, 1), got {burn_in}')
+    if int(thin) != thin or thin < 1:
+        raise ValueError(f'thin must be a positive integer, got {thin}')
+    thin = int(thin)
+    file_list = _resolve_paths(path)
+    all_columns = ['weight', '-LogLkl'] + params
+    if columns is None:
+        columns = params if params_only else all_columns
+    usecols = [all_columns.index(column) for column in columns]
+    pushdown = columns != all_columns or burn_in > 0 or thin > 1
+    if cache_dir is not None:
+        blocks = ChainCache(cache_dir).load(file_list, parallel, max_workers)
+        chains = np.concatenate([block[int(burn_in * len(block))::thin, usecols] for block in blocks])
+    elif parallel or pushdown:
+        chains = _load_preallocated(file_list, usecols, burn_in, thin, max_workers if parallel else 1)
     else:
-        df = pd.DataFrame(chains, columns=columns)
-    return df
+        array_list = [np.loadtxt(filename) for filename in tqdm(file_list)]
+        chains = np.vstack(array_list)
+    return pd.DataFrame(chains, columns=columns)
@@ -0,0 +1,137 @@
+import numpy as np
+
+# weight-aware downsampling of chains into a small set of points to display
+
+
+# look up a column of the chains as a float array, or pass an array-like through
+def _column_values(data, column, length):
+    if column is None:
+        return None
+    if isinstance(column, str):
+        if column not in data.columns:
+            return None
+        return np.asarray(data[column], dtype=float)
+    values = np.asarray(column, dtype=float)
+    if len(values) != length:
+        raise ValueError(f'expected {length} values, got {len(values)}')
+    return values
+
+
+# pick the k smallest keys inside each stratum, all at once
+def _smallest_per_group(keys, groups, counts):
+    order = np.lexsort((keys, groups))
+    sorted_groups = groups[order]
+    starts = np.searchsorted(sorted_groups, np.arange(len(counts)))
+    rank = np.arange(len(order)) - starts[sorted_groups]
+    return order[rank < counts[sorted_groups]]
+
+
+# split n draws across strata in proportion to their weight, by largest remainder
+def _allocate(n, mass, available):
+    if mass.sum() == 0:
+        return np.zeros(len(mass), dtype=int)
+    quota = n * mass / mass.sum()
+    counts = np.minimum(np.floor(quota).astype(int), available)
+    remainder = np.where(counts < available, quota - counts, -np.inf)
+    for s in np.argsort(-remainder)[:n - counts.sum()]:
+        if counts[s] < available[s]:
+            counts[s] += 1
+    return counts
+
+
+def subsample(
+    data,
+    n: int,
+    method: str = 'multiplicity',
+    weights='weight',
+    loglkl='-LogLkl',
+    keep_best: int = 0,
+    strata: int = 10,
+    random_state=None
+):
+    """
+    Draw a small set of samples from the chains that still represents the posterior.
+
+    Parameters
+    ----------
+    data: Pandas DataFrame or ChainDataset
+        the chains to draw from
+
+    n: int
+        number of samples to return (fewer if the chains are shorter)
+
+    method: string
+        'multiplicity' draws without replacement with probability proportional to the weights,
+        'stratified' splits the samples into quantiles of the likelihood and draws from each
+        in proportion to its posterior mass, and 'uniform' ignores the weights
+
+    weights: string or array-like
+        column holding the multiplicity of each sample, or the weights themselves.
+        None to weight the samples equally
+
+    loglkl: string or array-like
+        column holding the negative log likelihood, or the values themselves.
+        required by 'stratified' and keep_best
+
+    keep_best: int
+        always include this many of the best-fit (lowest -LogLkl) samples, at most n
+
+    strata: int
+        number of likelihood quantiles used by 'stratified'
+
+    random_state: int or numpy Generator
+        seed for reproducible draws
+
+    Returns
+    -------
+    the chosen rows of data, in their original order
+    """
+    length = len(data)
+    n = min(n, length)
+    rng = np.random.default_rng(random_state)
+    keep_best = min(keep_best, n)
+    w = _column_values(data, weights, length)
+    if w is None:
+        if weights is not None and method != 'uniform':
+            raise ValueError(f"'{weights}' is needed by method '{method}', but it is not in the data. "
+                             f"pass weights=None to weight the samples equally")
+        w = np.ones(length)
+    lkl = _column_values(data, loglkl, length)
+    if lkl is None and (method == 'stratified' or keep_best > 0):
+        raise ValueError(f"'{loglkl}' is needed to stratify or keep the best fit, but it is not in the data")
+
+    chosen = np.zeros(length, dtype=bool)
+    if keep_best > 0:
+        chosen[np.argpartition(lkl, keep_best - 1)[:keep_best]] = True
+    remaining = n - chosen.sum()
+    if remaining <= 0:
+        return data.iloc[np.flatnonzero(chosen)]
+
+    # exponential race: the k smallest of E/w are a weighted sample without replacement
+    if method == 'uniform':
+        keys = rng.random(length)
+    elif method in ('multiplicity', 'stratified'):
+        with np.errstate(divide='ignore'):
+            keys = rng.exponential(size=length) / w
+    else:
+        raise ValueError(f"unknown method '{method}', expected 'multiplicity', 'stratified' or 'uniform'")
+    keys[chosen] = np.inf
+    eligible = ~chosen
+    if method != 'uniform':
+        eligible &= w > 0
+
+    if method == 'stratified':
+        # weighted quantiles of the likelihood define strata of equal posterior mass
+        order = np.argsort(lkl)
+        cdf = np.cumsum(w[order]) / w.sum()
+        groups = np.empty(length, dtype=int)
+        groups[order] = np.minimum((cdf * strata).astype(int), strata - 1)
+        mass = np.bincount(groups, weights=w * eligible, minlength=strata)
+        available = np.bincount(groups, weights=eligible, minlength=strata).astype(int)
+        counts = _allocate(remaining, mass, available)
+        picks = _smallest_per_group(keys, groups, counts)
+    else:
+        remaining = min(remaining, eligible.sum())
+        picks = np.argpartition(keys, remaining - 1)[:remaining] if remaining > 0 else []
+    chosen[picks] = True
+    return data.iloc[np.flatnonzero(chosen)]
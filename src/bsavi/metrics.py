@@ -0,0 +1,202 @@
+import time
+import logging
+import itertools
+import numpy as np
+import tornado.web
+import panel as pn
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock, Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# latency of the stages of viz dashboards, per session and for the whole process
+
+logger = logging.getLogger('bsavi.metrics')
+
+_quantiles = (0.5, 0.95)
+_names = itertools.count()
+
+
+class _Stage:
+    def __init__(self, recent=1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.recent = deque(maxlen=recent)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+        self.recent.append(seconds)
+
+    def summary(self):
+        summary = {'count': self.count, 'total': self.total, 'mean': self.total / self.count,
+                   'max': self.max, 'last': self.last}
+        values = np.quantile(np.fromiter(self.recent, float), _quantiles)
+        summary.update({f'p{round(100 * q)}': value for q, value in zip(_quantiles, values)})
+        return summary
+
+
+class Metrics:
+    """
+    Latency of the stages of a dashboard and counts of events such as cache hits.
+
+    Every duration is added to the aggregates of this session and of the process, and
+    logged as a DEBUG record of the 'bsavi.metrics' logger carrying ``stage``, ``seconds``
+    and ``session`` attributes. Quantiles are computed over the latest 1024 durations.
+
+    Parameters
+    ----------
+    session: string
+        name of the session. by default the id of the Bokeh session, or a counter
+        outside of a server
+
+    aggregate: bool
+        whether to also add the durations to the process-wide metrics. in a Bokeh server,
+        the session is also reported at the metrics endpoint until it is destroyed
+    """
+    def __init__(self, session: str = None, aggregate: bool = True):
+        self.session = session or _session_name()
+        self.parent = process_metrics if aggregate else None
+        self._stages = {}
+        self._counters = {}
+        self._lock = Lock()
+        # only server sessions are reported one by one, as only they tell when they are gone
+        context = getattr(pn.state.curdoc, 'session_context', None)
+        if aggregate and context is not None:
+            _sessions[self.session] = self
+            pn.state.curdoc.on_session_destroyed(lambda context: self.close())
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the body of a with block as the given stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        """Add a duration, in seconds, to the given stage."""
+        self._add(name, seconds)
+        if self.parent is not None:
+            self.parent._add(name, seconds)
+        logger.debug('%s: %s took %.2f ms', self.session, name, 1e3 * seconds,
+                     extra={'stage': name, 'seconds': seconds, 'session': self.session})
+
+    def count(self, name: str, value: float = 1):
+        """Add to the counter of the given event."""
+        self._count(name, value)
+        if self.parent is not None:
+            self.parent._count(name, value)
+
+    def _add(self, name, seconds):
+        with self._lock:
+            if name not in self._stages:
+                self._stages[name] = _Stage()
+            self._stages[name].add(seconds)
+
+    def _count(self, name, value):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def summary(self):
+        """Return the count, total, mean, max, last, p50 and p95 of each stage, and the counters."""
+        with self._lock:
+            stages = {name: stage.summary() for name, stage in self._stages.items()}
+            counters = dict(self._counters)
+        return {'stages': stages, 'counters': counters}
+
+    def table(self):
+        """The summary as plain text, one line per stage, in milliseconds."""
+        summary = self.summary()
+        lines = [f'{"stage":<14}{"count":>7}{"last":>10}{"mean":>10}{"p50":>10}{"p95":>10}{"max":>10}']
+        for name, stage in summary['stages'].items():
+            lines.append(f'{name:<14}{stage["count"]:>7d}' + ''.join(
+                f'{1e3 * stage[key]:>10.1f}' for key in ('last', 'mean', 'p50', 'p95', 'max')))
+        lines += [f'{name:<14}{value:>7g}' for name, value in summary['counters'].items()]
+        return '\n'.join(lines)
+
+    def text(self):
+        """The summary in the Prometheus text format."""
+        summary = self.summary()
+        lines = []
+        for name, stage in summary['stages'].items():
+            labels = f'session="{self.session}",stage="{name}"'
+            for q in _quantiles:
+                lines.append(f'bsavi_stage_seconds{{{labels},quantile="{q}"}} {stage[f"p{round(100 * q)}"]:.6g}')
+            lines.append(f'bsavi_stage_seconds_sum{{{labels}}} {stage["total"]:.6g}')
+            lines.append(f'bsavi_stage_seconds_count{{{labels}}} {stage["count"]}')
+            lines.append(f'bsavi_stage_seconds_max{{{labels}}} {stage["max"]:.6g}')
+        for name, value in summary['counters'].items():
+            lines.append(f'bsavi_events_total{{session="{self.session}",event="{name}"}} {value:g}')
+        return '\n'.join(lines)
+
+    def close(self):
+        """Stop reporting this session. Its durations stay in the process-wide aggregates."""
+        _sessions.pop(self.session, None)
+
+
+def _session_name():
+    context = getattr(pn.state.curdoc, 'session_context', None)
+    if context is not None:
+        return context.id
+    return f'viz-{next(_names)}'
+
+
+# the open sessions, by name
+_sessions = {}
+process_metrics = Metrics('process', aggregate=False)
+
+
+def metrics_text():
+    """The metrics of the process and of every open session, in the Prometheus text format."""
+    parts = [process_metrics.text()] + [metrics.text() for metrics in list(_sessions.values())]
+    return '# TYPE bsavi_stage_seconds summary\n' + '\n'.join(part for part in parts if part) + '\n'
+
+
+# serves metrics_text at /metrics
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_servers = {}
+
+
+def serve_metrics(port: int = 9464, address: str = '127.0.0.1'):
+    """
+    Serve the metrics as plain text at http://address:port/metrics from a background
+    thread, e.g. next to ``panel serve``. Calling it again with the same address and port
+    returns the running server.
+    """
+    if (address, port) not in _servers:
+        server = ThreadingHTTPServer((address, port), _Handler)
+        server.daemon_threads = True
+        Thread(target=server.serve_forever, name='bsavi-metrics', daemon=True).start()
+        _servers[(address, port)] = server
+    return _servers[(address, port)]
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """
+    Tornado handler serving the metrics as plain text from the server of the app, e.g.
+    ``pn.serve(app, extra_patterns=[('/metrics', MetricsHandler)])``.
+    """
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(metrics_text())
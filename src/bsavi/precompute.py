@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import importlib.util
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from tqdm import tqdm
+
+# evaluate a LiveObservable for every sample ahead of time and tabulate the results into a store
+# that Observable.from_store reads back. layout of a store directory:
+#   manifest.json    number of rows, and the name, plot type, columns and array file of each observable
+#   <i>_<j>.npy      column j of observable i, one row per sample (NaN until computed). the grid
+#                    in the first column is stored as a single row while it is the same for every
+#                    sample, and listed as shared
+#   done.npy         which rows have been computed, rewritten at every checkpoint
+
+_MANIFEST = 'manifest.json'
+_DONE = 'done.npy'
+
+# the function and arguments of the observable, set once in each worker process
+_worker_call = None
+
+
+def _init_worker(myfunc, myfunc_args):
+    global _worker_call
+    _worker_call = (myfunc, myfunc_args)
+
+
+def _call_worker(n):
+    myfunc, myfunc_args = _worker_call
+    return myfunc(n, *myfunc_args)
+
+
+def _evaluate(n):
+    return n, _call_worker(n)
+
+
+# write a file atomically so an interrupted checkpoint never leaves it half written
+def _replace(path, write):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class _Store:
+    def __init__(self, directory, names, rows, plot_types=None):
+        self.directory = directory
+        self.names = names
+        self.rows = rows
+        self.plot_types = plot_types
+        self.arrays = None
+        self.manifest = None
+        path = os.path.join(directory, _MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            if manifest['rows'] != rows or [o['name'] for o in manifest['observables']] != names:
+                raise ValueError(f'{directory} holds a different store: {manifest["rows"]} rows of '
+                                 f'{[o["name"] for o in manifest["observables"]]}')
+            self._open(manifest)
+            self.done = np.load(os.path.join(directory, _DONE))
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.done = np.zeros(rows, dtype=bool)
+
+    def _open(self, manifest):
+        self.manifest = manifest
+        self.arrays = [
+            [np.load(os.path.join(self.directory, filename), mmap_mode='r+') for filename in observable['files']]
+            for observable in manifest['observables']
+        ]
+
+    def _new_array(self, filename, shape, fill):
+        array = np.lib.format.open_memmap(os.path.join(self.directory, filename), mode='w+', dtype=np.float64, shape=shape)
+        array[:] = fill
+        array.flush()
+        return array
+
+    def _write_manifest(self):
+        _replace(os.path.join(self.directory, _MANIFEST), lambda f: f.write(json.dumps(self.manifest, indent=1).encode()))
+
+    # the shapes of the arrays are only known once the first result is in
+    def _create(self, result):
+        observables = []
+        plot_types = self.plot_types or [None]
+        for i, name in enumerate(self.names):
+            columns = list(result[i].keys())
+            files = []
+            for j, column in enumerate(columns):
+                values = np.asarray(result[i][column], dtype=float)
+                filename = f'{i}_{j}.npy'
+                if j == 0:
+                    self._new_array(filename, (1, len(values)), values)
+                else:
+                    self._new_array(filename, (self.rows, len(values)), np.nan)
+                files.append(filename)
+            observables.append({
+                'name': name, 'plot_type': plot_types[i] if len(plot_types) > 1 else plot_types[0],
+                'columns': columns, 'files': files, 'shared': columns[:1]
+            })
+        self._open({'rows': self.rows, 'observables': observables})
+        self._write_manifest()
+        self.checkpoint()
+
+    # a grid that turns out to differ between samples gets one row per sample, like the other columns.
+    # the rows computed so far all had the shared grid
+    def _unshare(self, i, j):
+        observable = self.manifest['observables'][i]
+        grid = np.array(self.arrays[i][j][0])
+        filename = f'{i}_{j}_rows.npy'
+        array = self._new_array(filename, (self.rows, len(grid)), np.nan)
+        array[self.done] = grid
+        array.flush()
+        previous = observable['files'][j]
+        observable['files'][j] = filename
+        observable['shared'].remove(observable['columns'][j])
+        self.arrays[i][j] = np.load(os.path.join(self.directory, filename), mmap_mode='r+')
+        self._write_manifest()
+        os.remove(os.path.join(self.directory, previous))
+
+    def write(self, n, result):
+        if self.arrays is None:
+            self._create(result)
+        for i, observable in enumerate(self.manifest['observables']):
+            for j, column in enumerate(observable['columns']):
+                values = np.asarray(result[i][column], dtype=float)
+                if values.shape != self.arrays[i][j].shape[1:]:
+                    raise ValueError(
+                        f"'{column}' of '{observable['name']}' has {len(values)} values at index {n}, "
+                        f"but {self.arrays[i][j].shape[1]} at the first computed index"
+                    )
+                if column in observable.get('shared', []):
+                    if np.array_equal(values, self.arrays[i][j][0]):
+                        continue
+                    self._unshare(i, j)
+                self.arrays[i][j][n] = values
+        self.done[n] = True
+
+    # the arrays are flushed before the mask marks their rows as done
+    def checkpoint(self):
+        if self.arrays is None:
+            return
+        for arrays in self.arrays:
+            for array in arrays:
+                array.flush()
+        _replace(os.path.join(self.directory, _DONE), lambda f: np.save(f, self.done))
+
+
+def precompute(
+    observable,
+    data,
+    store: str,
+    rows=None,
+    max_workers: int = None,
+    checkpoint_every: float = 30.0,
+    progress: bool = True
+):
+    """
+    Evaluate a LiveObservable at every row of the samples (or the given rows) and tabulate
+    the results into a store that Observable.from_store loads in its place.
+
+    The store is checkpointed regularly, so running it again with the same arguments resumes
+    an interrupted job and only computes the missing rows.
+
+    Parameters
+    ----------
+    observable: LiveObservable
+        the observable to tabulate. with more than one worker, myfunc and myfunc_args are
+        handed to each worker process once
+
+    data: Pandas DataFrame or ChainDataset
+        the samples shown in viz. one row of the store is kept per sample
+
+    store: string
+        directory of the store. created if it does not exist
+
+    rows: array-like of int
+        row positions to compute. all rows by default
+
+    max_workers: int
+        number of worker processes. 1 evaluates in this process
+
+    checkpoint_every: float
+        seconds between checkpoints
+
+    progress: bool
+        whether to show a progress bar
+
+    Returns
+    -------
+    the number of rows computed by this call
+    """
+    length = len(data)
+    target = _Store(store, list(observable.name), length, getattr(observable, 'plot_type', None))
+    todo = np.arange(length) if rows is None else np.unique(np.asarray(rows, dtype=np.intp))
+    if todo.size and (todo[0] < 0 or todo[-1] >= length):
+        raise IndexError(f'rows out of bounds for {length} samples')
+    todo = todo[~target.done[todo]]
+
+    computed = 0
+    pool = None
+    last = time.monotonic()
+    bar = tqdm(total=len(todo), disable=not progress)
+    try:
+        if max_workers == 1:
+            results = ((n, observable.myfunc(n, *observable.myfunc_args)) for n in todo)
+        else:
+            workers = max_workers or os.cpu_count() or 1
+            pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                       initargs=(observable.myfunc, observable.myfunc_args))
+            results = _completed(pool, todo, workers * 4)
+        for n, result in results:
+            target.write(n, result)
+            computed += 1
+            bar.update()
+            if time.monotonic() - last > checkpoint_every:
+                target.checkpoint()
+                last = time.monotonic()
+    finally:
+        bar.close()
+        target.checkpoint()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return computed
+
+
+# results of the pool in completion order, keeping a bounded number of rows in flight
+def _completed(pool, todo, in_flight):
+    queue = iter(todo)
+    pending = {pool.submit(_evaluate, n) for _, n in zip(range(in_flight), queue)}
+    while pending:
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            yield future.result()
+            n = next(queue, None)
+            if n is not None:
+                pending.add(pool.submit(_evaluate, n))
+
+
+def load_store(store: str, complete: bool = False):
+    """
+    Read a store written by precompute, memory-mapped.
+
+    Returns the observable names and, for each, a dict of column name to 2D array with one
+    row per sample. A grid shared by every sample is broadcast from its single stored row.
+    Rows that have not been computed hold NaN. With complete=True, raise if any row is missing.
+    """
+    with open(os.path.join(store, _MANIFEST)) as f:
+        manifest = json.load(f)
+    if complete:
+        done = np.load(os.path.join(store, _DONE))
+        if not done.all():
+            raise ValueError(f'{store} is missing {np.count_nonzero(~done)} of {len(done)} rows')
+    names = []
+    data = []
+    for observable in manifest['observables']:
+        names.append(observable['name'])
+        columns = {}
+        for column, filename in zip(observable['columns'], observable['files']):
+            array = np.load(os.path.join(store, filename), mmap_mode='r')
+            if column in observable.get('shared', []):
+                array = np.broadcast_to(array[0], (manifest['rows'], array.shape[1]))
+            columns[column] = array
+        data.append(columns)
+    return names, data
+
+
+# plot type of each observable of a store, None where it wasn't recorded
+def _plot_types(store):
+    with open(os.path.join(store, _MANIFEST)) as f:
+        return [observable.get('plot_type') for observable in json.load(f)['observables']]
+
+
+# import `attribute` from 'package.module:attribute' or 'path/to/file.py:attribute'
+def _load_object(spec):
+    location, _, attribute = spec.rpartition(':')
+    if not location:
+        raise ValueError(f"expected 'module:attribute' or 'file.py:attribute', got '{spec}'")
+    if location.endswith('.py'):
+        module_name = os.path.splitext(os.path.basename(location))[0]
+        module_spec = importlib.util.spec_from_file_location(module_name, location)
+        module = importlib.util.module_from_spec(module_spec)
+        sys.modules[module_name] = module
+        module_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(location)
+    return getattr(module, attribute)
+
+
+# the samples a LiveObservable indexes: the first table among its arguments
+def _default_data(observable):
+    for arg in observable.myfunc_args:
+        if hasattr(arg, 'iloc') and hasattr(arg, 'columns'):
+            return arg
+    raise ValueError('the observable has no table among myfunc_args, pass the samples with --data')
+
+
+def _parse_rows(text, length):
+    if ':' in text:
+        return np.arange(length)[slice(*(int(part) if part else None for part in text.split(':')))]
+    return np.array([int(part) for part in text.split(',')])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='bsavi-precompute',
+        description='Tabulate a LiveObservable over the samples into a store that Observable.from_store loads.'
+    )
+    parser.add_argument('observable', help="the LiveObservable, as 'module:name' or 'file.py:name'")
+    parser.add_argument('store', help='directory of the store. reruns resume where the last one stopped')
+    parser.add_argument('--data', help="the samples, as 'module:name' or 'file.py:name'. "
+                                       "by default the first table among the observable's arguments")
+    parser.add_argument('--rows', help="rows to compute, as 'start:stop[:step]' or a comma separated list")
+    parser.add_argument('--max-workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--checkpoint-every', type=float, default=30.0, help='seconds between checkpoints')
+    args = parser.parse_args(argv)
+
+    observable = _load_object(args.observable)
+    data = _load_object(args.data) if args.data else _default_data(observable)
+    rows = None if args.rows is None else _parse_rows(args.rows, len(data))
+    computed = precompute(observable, data, args.store, rows, args.max_workers, args.checkpoint_every)
+    print(f'computed {computed} rows into {args.store}')
+
+
+if __name__ == '__main__':
+    main()
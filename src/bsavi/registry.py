@@ -0,0 +1,275 @@
+import io
+import os
+import glob
+import stat
+import pickle
+import hashlib
+import tempfile
+import numpy as np
+from threading import Lock
+from .cache import DiskCache, _function_identity
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# values loaded once per server and shared by its sessions, and by its processes through memory-mapped files
+
+
+# where the arrays of shared values are kept by default: memory on Linux, the temporary directory elsewhere
+def _default_directory():
+    if fcntl is None:
+        return None
+    root = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(root, f'bsavi-registry-{os.getuid()}')
+
+
+_missing = object()
+
+
+# the absolute path, size and modification time of the files a string names, directly or as a glob pattern
+def _files(value):
+    try:
+        paths = sorted(glob.glob(value)) if glob.has_magic(value) else [value]
+        described = []
+        for path in paths:
+            status = os.stat(path)
+            if stat.S_ISREG(status.st_mode):
+                described.append(f'{os.path.abspath(path)}:{status.st_size}:{status.st_mtime_ns}')
+        return described
+    except (OSError, ValueError):
+        return []
+
+
+# stable description of a loader argument for keys. only plain values contribute their contents,
+# and strings also the files they name, so that editing the files reloads the value
+def _describe(value):
+    if isinstance(value, os.PathLike):
+        value = os.fspath(value)
+    if isinstance(value, str):
+        return ' '.join([repr(value)] + _files(value))
+    if isinstance(value, (int, float, bool, type(None))):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(_describe(item) for item in value) + ']'
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{_describe(key)}: {_describe(item)}' for key, item in value.items()) + '}'
+    return type(value).__qualname__
+
+
+# pickles a value with its large numeric arrays set aside, to be saved as .npy files. a broadcast
+# array is saved as the values it repeats, and broadcast again to its shape when loaded
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, min_bytes):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.min_bytes = min_bytes
+        self.arrays = []
+
+    def persistent_id(self, obj):
+        if type(obj) in (np.ndarray, np.memmap) and obj.dtype.kind in 'biufc' and obj.nbytes >= max(self.min_bytes, 1):
+            if 0 in obj.strides and obj.size:
+                self.arrays.append(obj[tuple(slice(0, 1) if stride == 0 else slice(None) for stride in obj.strides)])
+                return len(self.arrays) - 1, obj.shape
+            self.arrays.append(obj)
+            return len(self.arrays) - 1
+        return None
+
+
+# unpickles a value with its arrays memory-mapped, read-only, from their .npy files
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, prefix):
+        super().__init__(file)
+        self.prefix = prefix
+
+    def persistent_load(self, pid):
+        if isinstance(pid, tuple):
+            i, shape = pid
+            return np.broadcast_to(np.load(f'{self.prefix}-{i}.npy', mmap_mode='r'), shape)
+        return np.load(f'{self.prefix}-{pid}.npy', mmap_mode='r')
+
+
+# what a result cache is made of. a DiskCache holds a lock, so only its settings are shared and
+# each process builds its own on the same directory
+def _result_settings(directory, max_bytes):
+    return directory, max_bytes
+
+
+class SharedRegistry:
+    """
+    Datasets, observables and other values loaded once and shared by every session.
+
+    Each value is loaded by the first session asking for it and handed to the later ones as
+    is, so they must not modify it. With a directory, the value is also saved there: its
+    numeric arrays as .npy files and the rest pickled. The other processes of
+    ``panel serve --num-procs`` then memory-map the arrays instead of loading the value again,
+    so they share its memory. File locks make sure only one process loads each value. Values
+    that can't be pickled, e.g. holding locks or functions defined in the served script, are
+    only shared within each process.
+
+    Parameters
+    ----------
+    directory: string
+        where the values are saved. a directory in /dev/shm by default, or in the
+        temporary directory without /dev/shm. None to only share values within the process.
+        it must belong to the current user and be writable by no one else
+
+    min_bytes: int
+        arrays smaller than this are pickled with the rest of the value instead of
+        memory-mapped
+    """
+    def __init__(self, directory: str = _default_directory(), min_bytes: int = 2**16):
+        if directory is not None and fcntl is None:
+            raise ValueError('sharing values between processes needs file locks, which are not available on this platform')
+        self.directory = directory
+        self.min_bytes = min_bytes
+        self._values = {}
+        self._locks = {}
+        self._lock = Lock()
+        self._result_caches = {}
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    # the values of a name are told apart by their loader, its arguments and the files they name, and the
+    # working directory relative paths are read from, so editing any of them reloads the value. keys
+    # start with the name, so that the values a name had before can be found and removed
+    def _key(self, name, loader, args, kwargs):
+        parts = [name, os.getcwd(), _function_identity(loader), _describe(args), _describe(kwargs)]
+        digest = hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+        return f'{hashlib.sha256(name.encode()).hexdigest()[:16]}-{digest}'
+
+    def get(self, name: str, loader, *args, **kwargs):
+        """
+        Return the value shared under name, calling loader(*args, **kwargs) if neither this
+        process nor, with a directory, another process has loaded it yet.
+        """
+        key = self._key(name, loader, args, kwargs)
+        with self._lock:
+            lock = self._locks.setdefault(name, Lock())
+        with lock:
+            if name in self._values and self._values[name][0] == key:
+                return self._values[name][1]
+            if self.directory is None:
+                value = loader(*args, **kwargs)
+            else:
+                value = self._load_shared(key, loader, args, kwargs)
+            self._values[name] = (key, value)
+            return value
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    # values are unpickled from the directory, so it must belong to this user and be writable by no one else
+    def _open_directory(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        status = os.lstat(self.directory)
+        if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o022:
+            raise PermissionError(f'{self.directory} must be a directory owned by this user that only they can write to')
+
+    def _load_shared(self, key, loader, args, kwargs):
+        prefix = self._path(key)
+        self._open_directory()
+        with open(f'{prefix}.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                value = self._read(prefix)
+                if value is not _missing:
+                    return value
+                value = loader(*args, **kwargs)
+                self._remove_others(key)
+                if self._write(prefix, value):
+                    # hand out the mapped copy, so this process doesn't keep a private one
+                    mapped = self._read(prefix)
+                    if mapped is not _missing:
+                        return mapped
+                return value
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # a value that is missing, or refers to code this process can't import, is loaded again
+    def _read(self, prefix):
+        try:
+            with open(f'{prefix}.pkl', 'rb') as f:
+                return _Unpickler(f, prefix).load()
+        except (OSError, EOFError, ImportError, AttributeError, pickle.UnpicklingError):
+            return _missing
+
+    # arrays first and the pickle last, so a value is only found once it is complete
+    def _write(self, prefix, value):
+        buffer = io.BytesIO()
+        pickler = _Pickler(buffer, self.min_bytes)
+        try:
+            pickler.dump(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return False
+        for i, array in enumerate(pickler.arrays):
+            self._replace(f'{prefix}-{i}.npy', lambda f: np.save(f, array))
+        self._replace(f'{prefix}.pkl', lambda f: f.write(buffer.getvalue()))
+        return True
+
+    # the files of the values a name had before its loader, arguments or files changed. processes
+    # still mapping their arrays keep them until they are done
+    def _remove_others(self, key):
+        name = key.split('-', 1)[0]
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(f'{name}-') and not entry.name.startswith((f'{key}.', f'{key}-')):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _replace(self, path, write):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def result_cache(self, name: str, max_bytes: int = 2**28):
+        """
+        A DiskCache in the directory of the registry, to pass as the cache of a LiveObservable
+        so that every session and process reuses the results computed by the others. the
+        sessions of a process share one DiskCache, and the processes its directory.
+        """
+        if self.directory is None:
+            raise ValueError('a registry without a directory keeps no results')
+        settings = self.get(f'results-{name}', _result_settings, os.path.join(self.directory, f'results-{name}'), max_bytes)
+        with self._lock:
+            if settings not in self._result_caches:
+                self._result_caches[settings] = DiskCache(*settings)
+            return self._result_caches[settings]
+
+    def clear(self):
+        """Forget every value, and remove the saved ones from the directory."""
+        with self._lock:
+            self._values.clear()
+            self._result_caches.clear()
+            if self.directory is not None:
+                if not os.path.isdir(self.directory):
+                    return
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith(('.pkl', '.npy')):
+                        try:
+                            os.remove(entry.path)
+                        except FileNotFoundError:
+                            pass
+
+
+default_registry = SharedRegistry()
+
+
+def shared(name: str, loader, *args, **kwargs):
+    """
+    Load a value once per server and share it between sessions, e.g.
+    ``chains = shared('chains', load_chains, pattern, params)`` in a served script.
+    See :py:class:`SharedRegistry`.
+    """
+    return default_registry.get(name, loader, *args, **kwargs)
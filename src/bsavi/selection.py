@@ -0,0 +1,163 @@
+import numpy as np
+from matplotlib.path import Path
+
+# resolve box and lasso selections made on the server-side rendered scatter into sample indices
+
+
+# indices of the samples inside the box (x0, y0, x1, y1)
+def box_indices(x, y, bounds):
+    x0, y0, x1, y1 = bounds
+    mask = (x >= min(x0, x1)) & (x <= max(x0, x1)) & (y >= min(y0, y1)) & (y <= max(y0, y1))
+    return np.flatnonzero(mask)
+
+
+# indices of the samples inside the polygon, given as an (N, 2) array of vertices
+def lasso_indices(x, y, polygon):
+    polygon = np.asarray(polygon, dtype=float)
+    if len(polygon) < 3:
+        return np.array([], dtype=np.intp)
+    (x0, y0), (x1, y1) = polygon.min(axis=0), polygon.max(axis=0)
+    candidates = box_indices(x, y, (x0, y0, x1, y1))
+    inside = Path(polygon).contains_points(np.column_stack([x[candidates], y[candidates]]))
+    return candidates[inside]
+
+
+# concatenate the integer ranges [starts[i], ends[i]) without a python loop
+def _ranges(starts, ends):
+    lengths = ends - starts
+    total = lengths.sum()
+    if total == 0:
+        return np.array([], dtype=np.intp)
+    shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return shifts + np.arange(total)
+
+
+class SpatialIndex:
+    """
+    Uniform grid index over two columns of the samples.
+
+    The samples are bucketed into a bins x bins grid and stored sorted by cell, so a box or
+    lasso query only looks at the cells it overlaps. Cells that lie entirely inside a lasso
+    are taken whole and only the samples in cells crossed by its outline are tested exactly,
+    which keeps queries over millions of samples in the millisecond range.
+
+    Parameters
+    ----------
+    x, y: array-like
+        coordinates of the samples. non-finite samples are never selected
+
+    bins: int
+        number of grid cells along each axis. by default about 16 samples per cell
+    """
+    def __init__(self, x, y, bins: int = None):
+        x = np.asarray(x)
+        y = np.asarray(y)
+        finite = np.isfinite(x) & np.isfinite(y)
+        if bins is None:
+            bins = int(np.clip(np.sqrt(finite.sum() / 16), 1, 1024))
+        self.bins = bins
+        if finite.any():
+            self.x_range = (x[finite].min(), x[finite].max())
+            self.y_range = (y[finite].min(), y[finite].max())
+        else:
+            self.x_range = self.y_range = (0.0, 1.0)
+        self._width = (self.x_range[1] - self.x_range[0]) / bins or 1.0
+        self._height = (self.y_range[1] - self.y_range[0]) / bins or 1.0
+        cells = np.full(len(x), -1, dtype=np.intp)
+        cells[finite] = self._cell(x[finite], y[finite])
+        self._order = np.argsort(cells, kind='stable')
+        self._starts = np.searchsorted(cells[self._order], np.arange(bins * bins + 1))
+        self._x = x[self._order]
+        self._y = y[self._order]
+
+    def _column(self, x):
+        return np.clip(np.asarray((x - self.x_range[0]) / self._width).astype(np.intp), 0, self.bins - 1)
+
+    def _row(self, y):
+        return np.clip(np.asarray((y - self.y_range[0]) / self._height).astype(np.intp), 0, self.bins - 1)
+
+    def _cell(self, x, y):
+        return self._column(x) * self.bins + self._row(y)
+
+    # original indices of the given positions in sorted order, in ascending order.
+    # large selections are sorted by scattering into a mask rather than by sorting
+    def _indices(self, positions):
+        if len(positions) * 64 < len(self._order):
+            return np.sort(self._order[positions])
+        mask = np.zeros(len(self._order), dtype=bool)
+        mask[self._order[positions]] = True
+        return np.flatnonzero(mask)
+
+    # positions in sorted order of the samples in the given cells
+    def _gather(self, cells):
+        return _ranges(self._starts[cells], self._starts[cells + 1])
+
+    # the cells of the grid overlapping a box, as (columns, rows) ranges. None if it misses the data.
+    # the box is clipped to the data first so that unbounded boxes don't overflow the cell indices
+    def _overlap(self, x0, y0, x1, y1):
+        if x1 < self.x_range[0] or x0 > self.x_range[1] or y1 < self.y_range[0] or y0 > self.y_range[1]:
+            return None
+        x0, x1 = max(x0, self.x_range[0]), min(x1, self.x_range[1])
+        y0, y1 = max(y0, self.y_range[0]), min(y1, self.y_range[1])
+        columns = np.arange(self._column(x0), self._column(x1) + 1)
+        rows = np.arange(self._row(y0), self._row(y1) + 1)
+        return columns, rows
+
+    def box(self, bounds):
+        """Return the sorted indices of the samples inside the box (x0, y0, x1, y1)."""
+        x0, y0, x1, y1 = bounds
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        overlap = self._overlap(x0, y0, x1, y1)
+        if overlap is None:
+            return np.array([], dtype=np.intp)
+        columns, rows = overlap
+        # the rows of one grid column are contiguous in sorted order
+        first = columns * self.bins + rows[0]
+        candidates = _ranges(self._starts[first], self._starts[first + len(rows)])
+        xs, ys = self._x[candidates], self._y[candidates]
+        inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        return self._indices(candidates[inside])
+
+    def lasso(self, polygon):
+        """Return the sorted indices of the samples inside the polygon, an (N, 2) array of vertices."""
+        polygon = np.asarray(polygon, dtype=float)
+        if len(polygon) < 3:
+            return np.array([], dtype=np.intp)
+        (x0, y0), (x1, y1) = polygon.min(axis=0), polygon.max(axis=0)
+        overlap = self._overlap(x0, y0, x1, y1)
+        if overlap is None:
+            return np.array([], dtype=np.intp)
+        columns, rows = overlap
+        path = Path(polygon)
+
+        # cells crossed by the outline: walk every edge in steps of at most half a cell. consecutive
+        # steps then move at most one cell along each axis, and when they move diagonally the edge
+        # passes through one of the two cells beside the corner, so all three are marked
+        start = polygon
+        end = np.roll(polygon, -1, axis=0)
+        steps = np.ceil(np.max(np.abs(end - start) / [self._width, self._height], axis=1) * 2).astype(int) + 1
+        t = _ranges(np.zeros(len(steps), dtype=int), steps) / np.repeat(steps, steps)
+        walk = np.repeat(start, steps, axis=0) + (np.repeat(end - start, steps, axis=0) * t[:, None])
+        walk = np.vstack([walk, polygon[:1]])
+        # cells outside the bounding box of the lasso land in a one-cell margin that is dropped
+        walk_columns = np.clip(self._column(walk[:, 0]) - columns[0], -1, len(columns)) + 1
+        walk_rows = np.clip(self._row(walk[:, 1]) - rows[0], -1, len(rows)) + 1
+        outline = np.zeros((len(columns) + 2, len(rows) + 2), dtype=bool)
+        outline[walk_columns, walk_rows] = True
+        outline[walk_columns[1:], walk_rows[:-1]] = True
+        outline[walk_columns[:-1], walk_rows[1:]] = True
+        outline = outline[1:-1, 1:-1]
+
+        # every other cell is either wholly inside or wholly outside: test its center
+        grid_columns, grid_rows = np.meshgrid(columns, rows, indexing='ij')
+        centers = np.column_stack([
+            self.x_range[0] + (grid_columns.ravel() + 0.5) * self._width,
+            self.y_range[0] + (grid_rows.ravel() + 0.5) * self._height,
+        ])
+        interior = path.contains_points(centers).reshape(outline.shape) & ~outline
+        cells = grid_columns * self.bins + grid_rows
+        whole = self._gather(cells[interior])
+        edge = self._gather(cells[outline])
+        inside = path.contains_points(np.column_stack([self._x[edge], self._y[edge]]))
+        return self._indices(np.concatenate([whole, edge[inside]]))
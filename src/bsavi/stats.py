@@ -0,0 +1,150 @@
+import numpy as np
+
+# weighted summaries of many samples at once
+
+
+def weighted_quantiles(values, weights=None, quantiles=(0.5,)):
+    """
+    Weighted quantiles of every column of a 2D array, computed for all columns at once.
+
+    Parameters
+    ----------
+    values: array-like
+        (samples, points) array, e.g. one curve per row evaluated on a common grid
+
+    weights: array-like
+        weight of each sample (row). equal weights by default
+
+    quantiles: sequence of float
+        quantiles to compute, between 0 and 1
+
+    Returns
+    -------
+    (len(quantiles), points) array
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    count, points = values.shape
+    weights = np.ones(count) if weights is None else np.asarray(weights, dtype=float)
+    if count == 1:
+        return np.repeat(values, len(quantiles), axis=0)
+    order = np.argsort(values, axis=0)
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    sorted_weights = weights[order]
+    # midpoint rule: each sample sits at the middle of its share of the total weight
+    cdf = (np.cumsum(sorted_weights, axis=0) - 0.5 * sorted_weights) / sorted_weights.sum(axis=0)
+    columns = np.arange(points)
+    result = np.empty((len(quantiles), points))
+    for j, q in enumerate(quantiles):
+        upper = np.clip((cdf < q).sum(axis=0), 1, count - 1)
+        lower = upper - 1
+        low_cdf, high_cdf = cdf[lower, columns], cdf[upper, columns]
+        span = np.where(high_cdf > low_cdf, high_cdf - low_cdf, 1.0)
+        fraction = np.clip((q - low_cdf) / span, 0.0, 1.0)
+        low, high = sorted_values[lower, columns], sorted_values[upper, columns]
+        result[j] = low + fraction * (high - low)
+    return result
+
+
+# separable gaussian smoothing of a 1D or 2D grid, with sigma in bins, as a product with a
+# banded matrix along each axis. mass near the edges leaks out rather than piling up
+def _smooth(grid, sigma):
+    if not sigma:
+        return grid
+    radius = int(np.ceil(4 * sigma))
+    norm = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma)**2).sum()
+    for axis in range(grid.ndim):
+        offsets = np.arange(grid.shape[axis])
+        offsets = offsets[:, None] - offsets[None, :]
+        kernel = np.where(np.abs(offsets) <= radius, np.exp(-0.5 * (offsets / sigma)**2), 0.0) / norm
+        grid = np.moveaxis(np.tensordot(kernel, grid, axes=(1, axis)), 0, axis)
+    return grid
+
+
+def _finite(values, weights):
+    keep = np.isfinite(values).all(axis=0)
+    if weights is not None:
+        keep &= np.isfinite(weights)
+        weights = weights[keep]
+    return values[:, keep], weights
+
+
+def weighted_histogram(values, weights=None, bins: int = 50, range=None, smooth: float = 0.0):
+    """
+    Weighted 1D density of the samples, normalized to unit integral.
+
+    Parameters
+    ----------
+    values: array-like
+        value of each sample. non-finite samples are left out
+
+    weights: array-like
+        weight of each sample. equal weights by default
+
+    bins: int
+        number of bins
+
+    range: (float, float)
+        range of the bins. the range of the values by default
+
+    smooth: float
+        width of the gaussian smoothing, in bins. 0 for none
+
+    Returns
+    -------
+    (edges, density) with bins + 1 edges
+    """
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+    (values,), weights = _finite(np.asarray(values, dtype=float)[None], weights)
+    counts, edges = np.histogram(values, bins=bins, range=range, weights=weights)
+    counts = _smooth(counts.astype(float), smooth)
+    total = counts.sum() * (edges[1] - edges[0])
+    return edges, counts / total if total > 0 else counts
+
+
+def weighted_density_2d(x, y, weights=None, bins: int = 50, range=None, smooth: float = 1.0):
+    """
+    Weighted 2D density of the samples on a grid, normalized to unit integral.
+
+    Parameters
+    ----------
+    x, y: array-like
+        coordinates of the samples. non-finite samples are left out
+
+    weights: array-like
+        weight of each sample. equal weights by default
+
+    bins: int
+        number of bins along each axis
+
+    range: ((float, float), (float, float))
+        ranges of the x and y bins. the ranges of the values by default
+
+    smooth: float
+        width of the gaussian smoothing, in bins. 0 for none
+
+    Returns
+    -------
+    (x centers, y centers, density) where density has shape (bins, bins) with y along the rows
+    """
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+    (x, y), weights = _finite(np.vstack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)]), weights)
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins, range=range, weights=weights)
+    counts = _smooth(counts, smooth)
+    total = counts.sum() * (x_edges[1] - x_edges[0]) * (y_edges[1] - y_edges[0])
+    density = counts / total if total > 0 else counts
+    return 0.5 * (x_edges[1:] + x_edges[:-1]), 0.5 * (y_edges[1:] + y_edges[:-1]), density.T
+
+
+def credible_levels(density, masses=(0.68, 0.95)):
+    """
+    Density thresholds of the highest density regions holding the given fractions of the
+    total mass of a gridded density, e.g. to draw 68% and 95% credible contours.
+    """
+    values = np.sort(np.ravel(density))[::-1]
+    cumulative = np.cumsum(values)
+    if cumulative[-1] <= 0:
+        return np.zeros(len(masses))
+    positions = np.searchsorted(cumulative / cumulative[-1], masses)
+    return values[np.clip(positions, 0, len(values) - 1)]
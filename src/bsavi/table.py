@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import panel as pn
+
+# table of the selected samples that only materializes the page being looked at
+
+
+class SelectionTable:
+    """
+    Paginated table of the selected samples, sorted and paged on the server.
+
+    The selection is kept as an array of row positions. Sorting argsorts the values of one
+    column at those positions, and only the rows of the visible page are read from the data
+    and sent to the browser, so selecting 10^5 samples costs no more than selecting a page.
+
+    Parameters
+    ----------
+    data: Pandas DataFrame or ChainDataset
+        the samples shown in viz
+
+    page_size: int
+        number of rows per page
+
+    first_columns: list of strings
+        columns shown first, e.g. the plotted ones
+    """
+    def __init__(self, data, page_size: int = 20, first_columns: list = None):
+        self.data = data
+        self.page_size = page_size
+        self.index = np.array([], dtype=np.intp)
+        self.order = self.index
+        self.page = 0
+        self._first_columns = list(first_columns or [])
+        # the values of each column sorted on so far, read once from the data
+        self._columns = {}
+        self.table = pn.widgets.Tabulator(
+            self._frame(self.index), disabled=True, show_index=False, height=300, width=600,
+            configuration={'columnDefaults': {'headerSort': False}}
+        )
+        self.sort_by = pn.widgets.Select(name='Sort by', value='index', options=['index'] + list(data.columns), width=150)
+        self.descending = pn.widgets.Checkbox(name='Descending', value=False, align='end', width=100)
+        self.previous_page = pn.widgets.Button(name='◀', width=40)
+        self.next_page = pn.widgets.Button(name='▶', width=40)
+        self.status = pn.pane.Str('', width=180, align='center')
+        self.previous_page.on_click(lambda event: self.show_page(self.page - 1))
+        self.next_page.on_click(lambda event: self.show_page(self.page + 1))
+        self.sort_by.param.watch(lambda event: self._sort(), 'value')
+        self.descending.param.watch(lambda event: self._sort(), 'value')
+        self.panel = pn.Column(
+            pn.pane.Markdown('**Selected Points**'),
+            self.table,
+            pn.Row(self.previous_page, self.status, self.next_page, self.sort_by, self.descending)
+        )
+        self._show()
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self.order) // self.page_size))
+
+    def update(self, index):
+        """Show a new selection of row positions, from its first page."""
+        self.index = np.asarray(index, dtype=np.intp)
+        self.page = 0
+        self._sort()
+
+    def set_data(self, data):
+        """Show the rows of new data, e.g. with rows appended, keeping the selection."""
+        self.data = data
+        self._columns = {}
+        self._show()
+
+    def set_first_columns(self, columns: list):
+        """Change the columns shown first and redraw the current page."""
+        self._first_columns = list(columns)
+        self._show()
+
+    def show_page(self, page: int):
+        self.page = int(np.clip(page, 0, self.pages - 1))
+        self._show()
+
+    # values of a column at the selected positions. 'index' is the label of each row
+    def _values(self, column):
+        if column == 'index':
+            if not hasattr(self.data, 'index'):
+                return self.index
+            if 'index' not in self._columns:
+                self._columns['index'] = np.asarray(self.data.index)
+            return self._columns['index'][self.index]
+        if hasattr(self.data, 'column'):
+            return self.data.column(column, rows=self.index)
+        if column not in self._columns:
+            self._columns[column] = self.data[column].to_numpy()
+        return self._columns[column][self.index]
+
+    def _sort(self):
+        if len(self.index) == 0:
+            self.order = self.index
+        else:
+            order = np.argsort(self._values(self.sort_by.value), kind='stable')
+            if self.descending.value:
+                order = order[::-1]
+            self.order = self.index[order]
+        self.page = min(self.page, self.pages - 1)
+        self._show()
+
+    # the rows at the given positions, with their labels in an 'index' column
+    def _frame(self, rows):
+        columns = list(dict.fromkeys(self._first_columns + list(self.data.columns)))
+        page = self.data.iloc[rows]
+        values = {'index': np.asarray(page.index)}
+        values.update({column: page[column].to_numpy() for column in columns if column != 'index'})
+        return pd.DataFrame(values)
+
+    def _show(self):
+        start = self.page * self.page_size
+        rows = self.order[start:start + self.page_size]
+        self.table.value = self._frame(rows)
+        if len(self.order):
+            self.status.object = f'{start + 1}-{start + len(rows)} of {len(self.order)} (page {self.page + 1}/{self.pages})'
+        else:
+            self.status.object = 'No Selection'
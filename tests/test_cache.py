@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bsavi import LiveObservable
+from bsavi.cache import DiskCache, result_key
+
+
+def wave(n, *args):
+    x = np.linspace(0, 1, 5)
+    return [{'x': x, 'y': np.full(5, float(n))}]
+
+
+def row_wave(n, samples):
+    x = np.linspace(0, 1, 5)
+    return [{'x': x, 'y': np.full(5, samples.iloc[n]['a'])}]
+
+
+def test_result_key_tells_indices_apart_without_tables():
+    grid = np.arange(10.)
+    assert result_key(wave, (), 0) != result_key(wave, (), 1)
+    assert result_key(wave, (grid,), 0) != result_key(wave, (grid,), 1)
+    assert result_key(wave, ({'grid': grid},), 0) != result_key(wave, ({'grid': grid},), 1)
+
+
+def test_result_key_shares_identical_rows():
+    samples = pd.DataFrame({'a': [1., 2., 1.]})
+    assert result_key(row_wave, (samples,), 0) == result_key(row_wave, (samples,), 2)
+    assert result_key(row_wave, (samples,), 0) != result_key(row_wave, (samples,), 1)
+
+
+def test_result_key_depends_on_argument_contents():
+    assert result_key(wave, ({'a': 1},), 0) != result_key(wave, ({'a': 2},), 0)
+    assert result_key(wave, (np.zeros(3),), 0) != result_key(wave, (np.ones(3),), 0)
+    assert result_key(wave, (), 0, version='1') != result_key(wave, (), 0, version='2')
+
+
+def test_result_key_rejects_undescribable_arguments():
+    with pytest.raises(TypeError):
+        result_key(wave, (lambda: None, (i for i in range(3))), 0)
+
+
+@pytest.mark.parametrize('args', [(), (np.arange(10.),)])
+def test_cached_results_follow_the_index(tmp_path, args):
+    for _ in range(2):
+        # the second pass reads every result from the cache
+        observable = LiveObservable('wave', wave, args, plot_type='Curve', cache=DiskCache(str(tmp_path)))
+        data = observable.generate_data([0, 1, 2])['wave']
+        assert [data[n]['y'][0] for n in (0, 1, 2)] == [0., 1., 2.]
+
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    result = [{'x': np.arange(3.), 'y': np.ones(3)}]
+    cache.put('key', result)
+    assert np.array_equal(DiskCache(str(tmp_path)).get('key')[0]['x'], result[0]['x'])
+    assert cache.get('missing') is None
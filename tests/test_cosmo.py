@@ -0,0 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+pytest.importorskip('classy')
+from bsavi.cosmo import cosmo
+
+
+def test_pool_is_started_once():
+    cosmo.close_pool()
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            pools = list(executor.map(lambda _: cosmo.get_pool(3), range(32)))
+        assert all(pool is pools[0] for pool in pools)
+        assert pools[0]._processes == 3
+        assert cosmo.get_pool(5) is pools[0]
+    finally:
+        cosmo.close_pool()
+    assert cosmo._pool is None
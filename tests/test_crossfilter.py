@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bsavi.crossfilter import CrossFilter
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(5000, 4)), columns=list('abcd'))
+    data.loc[::101, 'b'] = np.nan
+    return data
+
+
+def _brute_force(data, ranges, exclude=()):
+    mask = np.ones(len(data), dtype=bool)
+    for column, (low, high) in ranges.items():
+        if column not in exclude:
+            mask &= (data[column] >= low).to_numpy() & (data[column] <= high).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def test_moving_ranges_match_brute_force(samples):
+    engine = CrossFilter(samples)
+    rng = np.random.default_rng(1)
+    ranges = {}
+    for _ in range(50):
+        column = rng.choice(list('abc'))
+        low = rng.uniform(-2, 1)
+        ranges[column] = (low, low + rng.uniform(0, 2))
+        engine.filter(column, ranges[column][::-1])
+        np.testing.assert_array_equal(engine.index(), _brute_force(samples, ranges))
+        np.testing.assert_array_equal(engine.index(exclude=['a']), _brute_force(samples, ranges, ['a']))
+    engine.filter('a', None)
+    del ranges['a']
+    np.testing.assert_array_equal(engine.index(), _brute_force(samples, ranges))
+    engine.clear()
+    assert len(engine.index()) == len(samples)
+
+
+def test_unknown_column(samples):
+    with pytest.raises(KeyError):
+        CrossFilter(samples, columns=['a']).filter('b', (0, 1))
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+import pytest
+
+_check = "import sys\n{}\nprint(*[m for m in ('holoviews', 'panel', 'bokeh') if m in sys.modules])"
+
+
+@pytest.mark.parametrize('statement', ['import bsavi', 'import bsavi.loaders', 'from bsavi import loaders, stats, cache'])
+def test_loaders_import_without_the_visualization_stack(statement):
+    output = subprocess.run([sys.executable, '-c', _check.format(statement)], capture_output=True, text=True, check=True)
+    assert output.stdout.split() == []
+
+
+def test_loaders_next_to_holoviews_leave_out_panel_and_bokeh():
+    output = subprocess.run([sys.executable, '-c', _check.format('import bsavi.loaders, holoviews')],
+                            capture_output=True, text=True, check=True)
+    assert output.stdout.split() == ['holoviews']
+
+
+def test_names_of_the_dashboard_load_the_extensions():
+    output = subprocess.run([sys.executable, '-c', _check.format('import bsavi\nbsavi.Observable\nimport holoviews\nprint(*holoviews.Store.renderers)')],
+                            capture_output=True, text=True, check=True)
+    assert output.stdout.split() == ['bokeh', 'holoviews', 'panel', 'bokeh']
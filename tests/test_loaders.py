@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from bsavi.loaders import load_chains, ChainCache
+
+_params = ['a', 'b', 'c']
+
+
+# two chain files with the lines MontePython and hand edits leave behind: a header, blank and
+# whitespace-only lines, indented comments and comments between samples, and no final newline
+@pytest.fixture
+def chains(tmp_path):
+    rng = np.random.default_rng(0)
+    samples = []
+    for i in range(2):
+        rows = rng.random((13, 5))
+        lines = ['#  weight -LogLkl a b c']
+        for j, row in enumerate(rows):
+            lines.append(' '.join(repr(value) for value in row))
+            lines += {2: [''], 4: ['   # indented comment'], 6: ['# mid-chain comment'], 8: ['  \t ']}.get(j, [])
+        text = '\n'.join(lines)
+        (tmp_path / f'chain_{i}.txt').write_text(text + '\n' if i == 0 else text)
+        samples.append(rows)
+    return str(tmp_path / 'chain_*.txt'), np.vstack(samples), tmp_path
+
+
+# the pandas parser may round the last digit differently from numpy
+def _assert_samples(loaded, expected):
+    assert loaded.shape == expected.shape
+    np.testing.assert_allclose(loaded, expected, rtol=1e-14, atol=0)
+
+
+def _expected(samples, burn_in=0.0, thin=1):
+    files = np.split(samples, 2)
+    return np.vstack([rows[int(burn_in * len(rows))::thin] for rows in files])
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'parallel': True},
+    {'parallel': True, 'max_workers': 2},
+    {'cache': True},
+    {'cache': True, 'parallel': True},
+])
+@pytest.mark.parametrize('burn_in, thin', [(0.0, 1), (0.3, 1), (0.0, 3), (0.3, 2)])
+def test_every_load_path_reads_the_same_samples(chains, options, burn_in, thin):
+    pattern, samples, directory = chains
+    options = dict(options)
+    if options.pop('cache', False):
+        options['cache_dir'] = str(directory / 'cache')
+    for _ in range(2):
+        # with a cache, the second load reads the blocks built by the first
+        loaded = load_chains(pattern, _params, burn_in=burn_in, thin=thin, **options)
+        assert list(loaded.columns) == _params
+        _assert_samples(loaded.to_numpy(), _expected(samples, burn_in, thin)[:, 2:])
+
+
+def test_columns_are_projected(chains):
+    pattern, samples, _ = chains
+    loaded = load_chains(pattern, _params, columns=['c', 'weight'], parallel=True)
+    _assert_samples(loaded.to_numpy(), samples[:, [4, 0]])
+    everything = load_chains(pattern, _params, params_only=False)
+    assert list(everything.columns) == ['weight', '-LogLkl'] + _params
+
+
+def test_invalid_burn_in_and_thin(chains):
+    pattern = chains[0]
+    with pytest.raises(ValueError):
+        load_chains(pattern, _params, burn_in=1.0)
+    with pytest.raises(ValueError):
+        load_chains(pattern, _params, thin=0)
+
+
+def test_cache_keeps_each_dtype_and_rebuilds_changed_files(chains):
+    pattern, samples, directory = chains
+    files = sorted(str(path) for path in directory.glob('chain_*.txt'))
+    double = ChainCache(str(directory / 'cache'))
+    single = ChainCache(str(directory / 'cache'), dtype=np.float32)
+    assert double.load(files)[0].dtype == np.float64
+    assert single.load(files)[0].dtype == np.float32
+    assert double.load(files)[0].dtype == np.float64
+    with open(files[0], 'a') as f:
+        f.write('1 2 3 4 5\n')
+    assert len(double.load(files)[0]) == 14
+    _assert_samples(double.load(files)[1], samples[13:])
@@ -0,0 +1,59 @@
+import gc
+import numpy as np
+import pandas as pd
+import holoviews as hv
+import bsavi as bsv
+from bokeh.document import Document
+from bsavi import metrics
+from bsavi.metrics import Metrics, metrics_text
+
+_grid = np.linspace(0, 1, 10)
+
+
+def waves(n, samples):
+    return [{'x': _grid, 'y': _grid * samples.iloc[n]['a']}, {'x': _grid, 'y': _grid + samples.iloc[n]['b']}]
+
+
+def test_stages_and_counters():
+    session = Metrics('test-session', aggregate=False)
+    for seconds in (0.1, 0.2, 0.3):
+        session.record('layout', seconds)
+    session.count('cache_hit', 2)
+    summary = session.summary()
+    assert summary['stages']['layout']['count'] == 3
+    assert np.isclose(summary['stages']['layout']['mean'], 0.2)
+    assert summary['stages']['layout']['max'] == 0.3
+    assert summary['counters'] == {'cache_hit': 2}
+    assert 'bsavi_stage_seconds_count{session="test-session",stage="layout"} 3' in session.text()
+
+
+def test_sessions_outside_a_server_are_not_kept():
+    before = len(metrics._sessions)
+    for _ in range(3):
+        Metrics().record('layout', 0.1)
+    assert len(metrics._sessions) == before
+    assert 'session="process"' in metrics_text()
+
+
+def test_one_gather_per_selection_with_incremental_and_redrawn_panels():
+    samples = pd.DataFrame(np.random.default_rng(0).random((50, 3)), columns=list('abc'))
+    observable = bsv.LiveObservable(['curve', 'points'], waves, (samples,), plot_type=['Curve', 'Scatter'])
+    known = {id(stream) for stream in gc.get_objects() if isinstance(stream, hv.streams.Stream)}
+    dashboard = bsv.viz(samples, [observable], incremental=True)
+    doc = Document()
+    doc.add_root(dashboard.get_root(doc))
+    selection = [stream for stream in gc.get_objects() if isinstance(stream, hv.streams.Stream)
+                 and id(stream) not in known and list(stream.contents) == ['index']][0]
+    before = metrics.process_metrics.summary()
+    selection.event(index=[1, 2, 3])
+    selection.event(index=[1, 2])
+    after = metrics.process_metrics.summary()
+
+    def added(kind, name):
+        previous = before[kind].get(name, {'count': 0} if kind == 'stages' else 0)
+        current = after[kind][name]
+        return current['count'] - previous['count'] if kind == 'stages' else current - previous
+
+    assert added('stages', 'generate_plot') == 2
+    assert added('counters', 'cache_miss') == 3
+    assert added('counters', 'cache_hit') == 2
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bsavi import LiveObservable, Observable
+from bsavi.precompute import precompute, load_store
+
+_grid = np.linspace(0, 1, 4)
+
+
+def power(n, samples):
+    a = samples.iloc[n]['a']
+    return [{'k': _grid, 'p': a * _grid}, {'l': _grid, 'c': a + _grid}]
+
+
+def moving_grid(n, samples):
+    return [{'x': _grid + n, 'y': _grid * n}]
+
+
+@pytest.fixture
+def samples():
+    return pd.DataFrame({'a': np.arange(6, dtype=float)})
+
+
+def _observable(func, samples, names=('pk', 'cl'), plot_type=None):
+    return LiveObservable(list(names), func, (samples,), plot_type=plot_type)
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_round_trip(tmp_path, samples, max_workers):
+    store = str(tmp_path / 'store')
+    assert precompute(_observable(power, samples), samples, store, max_workers=max_workers, progress=False) == 6
+    names, data = load_store(store, complete=True)
+    assert names == ['pk', 'cl']
+    assert data[0]['k'].shape == (6, 4) and data[0]['k'].strides[0] == 0
+    for n in range(6):
+        expected = power(n, samples)
+        np.testing.assert_array_equal(data[0]['p'][n], expected[0]['p'])
+        np.testing.assert_array_equal(data[1]['c'][n], expected[1]['c'])
+
+
+def test_resume_computes_only_missing_rows(tmp_path, samples):
+    store = str(tmp_path / 'store')
+    observable = _observable(power, samples)
+    assert precompute(observable, samples, store, rows=[1, 3], max_workers=1, progress=False) == 2
+    with pytest.raises(ValueError):
+        load_store(store, complete=True)
+    names, data = load_store(store)
+    assert np.isnan(data[0]['p'][0]).all() and not np.isnan(data[0]['p'][1]).any()
+    assert precompute(observable, samples, store, max_workers=1, progress=False) == 4
+    assert precompute(observable, samples, store, max_workers=1, progress=False) == 0
+    load_store(store, complete=True)
+
+
+def test_grid_that_differs_between_samples(tmp_path, samples):
+    store = str(tmp_path / 'store')
+    precompute(_observable(moving_grid, samples, ['wave']), samples, store, max_workers=1, progress=False)
+    names, data = load_store(store, complete=True)
+    assert data[0]['x'].strides[0] != 0
+    for n in range(6):
+        np.testing.assert_array_equal(data[0]['x'][n], _grid + n)
+
+
+def test_store_of_another_observable_is_refused(tmp_path, samples):
+    store = str(tmp_path / 'store')
+    precompute(_observable(power, samples), samples, store, rows=[0], max_workers=1, progress=False)
+    with pytest.raises(ValueError):
+        precompute(_observable(moving_grid, samples, ['wave']), samples, store, max_workers=1, progress=False)
+
+
+@pytest.mark.parametrize('plot_type, expected', [(None, ['Curve', 'Curve']), (['Scatter', 'Curve'], ['Scatter', 'Curve'])])
+def test_from_store_draws_like_the_live_observable(tmp_path, samples, plot_type, expected):
+    store = str(tmp_path / 'store')
+    precompute(_observable(power, samples, plot_type=plot_type), samples, store, max_workers=1, progress=False)
+    observable = Observable.from_store(store)
+    assert observable.plot_type == expected
+    assert len(observable.draw_plot([0, 2])) == 2
+    np.testing.assert_array_equal(observable.generate_data([2])['pk'][2]['p'], power(2, samples)[0]['p'])
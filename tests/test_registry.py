@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import numpy as np
+import pytest
+from bsavi.cache import DiskCache
+from bsavi.registry import SharedRegistry
+
+
+def load_arrays(path):
+    load_arrays.calls += 1
+    grid = np.broadcast_to(np.linspace(0, 1, 1000), (500, 1000))
+    return {'values': np.load(path), 'grid': grid, 'label': 'chains'}
+
+
+load_arrays.calls = 0
+
+
+@pytest.fixture
+def data(tmp_path):
+    path = tmp_path / 'values.npy'
+    np.save(path, np.arange(100000.))
+    return str(path)
+
+
+def _loaded_elsewhere(directory, path, queue):
+    load_arrays.calls = 0
+    value = SharedRegistry(directory).get('arrays', load_arrays, path)
+    queue.put((load_arrays.calls, float(value['values'].sum()), type(value['values']).__name__))
+
+
+def test_values_are_loaded_once_and_mapped(tmp_path, data):
+    directory = str(tmp_path / 'registry')
+    registry = SharedRegistry(directory)
+    value = registry.get('arrays', load_arrays, data)
+    assert registry.get('arrays', load_arrays, data) is value
+    assert isinstance(value['values'], np.memmap) and not value['values'].flags.writeable
+    assert value['label'] == 'chains'
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_loaded_elsewhere, args=(directory, data, queue))
+    process.start()
+    assert queue.get(timeout=60) == (0, float(np.arange(100000.).sum()), 'memmap')
+    process.join()
+
+
+def test_broadcast_arrays_are_saved_once(tmp_path, data):
+    directory = tmp_path / 'registry'
+    grid = SharedRegistry(str(directory)).get('arrays', load_arrays, data)['grid']
+    assert grid.shape == (500, 1000) and grid.strides[0] == 0
+    np.testing.assert_array_equal(grid[7], np.linspace(0, 1, 1000))
+    assert sum(entry.stat().st_size for entry in os.scandir(directory)) < 2 * 100000 * 8
+
+
+def test_changed_files_are_loaded_again(tmp_path, data):
+    directory = tmp_path / 'registry'
+    registry = SharedRegistry(str(directory))
+    registry.get('arrays', load_arrays, data)
+    calls = load_arrays.calls
+    os.utime(data, ns=(0, 0))
+    np.testing.assert_array_equal(SharedRegistry(str(directory)).get('arrays', load_arrays, data)['values'], np.arange(100000.))
+    assert load_arrays.calls == calls + 1
+    assert len([entry for entry in os.listdir(directory) if entry.endswith('.pkl')]) == 1
+
+
+def test_result_cache_is_built_once_per_process(tmp_path):
+    registry = SharedRegistry(str(tmp_path / 'registry'))
+    cache = registry.result_cache('residuals', max_bytes=2**20)
+    assert isinstance(cache, DiskCache) and cache.max_bytes == 2**20
+    assert registry.result_cache('residuals', max_bytes=2**20) is cache
+    assert SharedRegistry(registry.directory).result_cache('residuals', max_bytes=2**20).directory == cache.directory
+
+
+def test_directory_must_be_private(tmp_path, data):
+    directory = tmp_path / 'registry'
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+    with pytest.raises(PermissionError):
+        SharedRegistry(str(directory)).get('arrays', load_arrays, data)
+
+
+def test_without_directory(data):
+    registry = SharedRegistry(None)
+    assert registry.get('arrays', load_arrays, data) is registry.get('arrays', load_arrays, data)
+    with pytest.raises(ValueError):
+        registry.result_cache('residuals')
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from bsavi.selection import SpatialIndex, box_indices, lasso_indices
+
+
+@pytest.fixture(params=[None, 7, 64])
+def samples(request):
+    rng = np.random.default_rng(0)
+    x = np.r_[rng.normal(size=20000), rng.uniform(-3, 3, 1000)]
+    y = np.r_[rng.normal(size=20000) * 0.5 + x[:20000] * 0.3, rng.uniform(-3, 3, 1000)]
+    x[::997] = np.nan
+    y[5::1009] = np.inf
+    return x, y, SpatialIndex(x, y, bins=request.param)
+
+
+_boxes = [
+    (-0.5, -0.5, 0.5, 0.5),
+    (1.0, 2.0, -1.0, -2.0),
+    (-10, -10, 10, 10),
+    (5, 5, 6, 6),
+    (0.1, -3, 0.1, 3),
+]
+
+_lassos = [
+    [(-1, -1), (1, -1), (0, 1.5)],
+    [(-2, -1), (2, -1), (2, 1), (0, 0), (-2, 1)],
+    [(-3, 0), (0, 3), (3, 0), (0, -3), (-3, 0.1), (0, 2.5), (2.5, 0), (0, -2.5)],
+    [(5, 5), (6, 5), (6, 6)],
+    [(0, 0), (1, 1)],
+]
+
+
+@pytest.mark.parametrize('bounds', _boxes)
+def test_box_matches_brute_force(samples, bounds):
+    x, y, index = samples
+    np.testing.assert_array_equal(index.box(bounds), box_indices(x, y, bounds))
+
+
+@pytest.mark.parametrize('polygon', _lassos)
+def test_lasso_matches_brute_force(samples, polygon):
+    x, y, index = samples
+    np.testing.assert_array_equal(index.lasso(polygon), lasso_indices(x, y, polygon))
+
+
+def test_non_finite_samples_are_never_selected(samples):
+    x, y, index = samples
+    selected = index.box((-np.inf, -np.inf, np.inf, np.inf))
+    assert np.isfinite(x[selected]).all() and np.isfinite(y[selected]).all()
+    assert len(selected) == np.count_nonzero(np.isfinite(x) & np.isfinite(y))
+
+
+def test_degenerate_data():
+    index = SpatialIndex(np.ones(10), np.arange(10.))
+    np.testing.assert_array_equal(index.box((1, 2, 1, 5)), [2, 3, 4, 5])
+    assert len(SpatialIndex(np.array([np.nan]), np.array([1.])).box((0, 0, 2, 2))) == 0
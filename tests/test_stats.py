@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from bsavi.stats import weighted_quantiles, weighted_histogram, weighted_density_2d, credible_levels
+
+
+@pytest.fixture
+def curves():
+    return np.random.default_rng(0).normal(size=(501, 20))
+
+
+def test_equal_weights_match_the_midpoint_quantiles(curves):
+    quantiles = (0.05, 0.16, 0.5, 0.84, 0.95)
+    expected = np.quantile(curves, quantiles, axis=0, method='hazen')
+    np.testing.assert_allclose(weighted_quantiles(curves, quantiles=quantiles), expected)
+    np.testing.assert_allclose(weighted_quantiles(curves, np.full(len(curves), 3.), quantiles), expected)
+
+
+def test_weights_shift_the_quantiles(curves):
+    weights = np.where(curves[:, 0] > 0, 100., 1.)
+    median = weighted_quantiles(curves, weights)[0]
+    assert median[0] > 0.5
+    assert abs(median[1:]).max() < 0.3
+
+
+def test_integer_weights_approach_repeated_samples():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=2000)
+    weights = rng.integers(1, 4, 2000)
+    weighted = weighted_quantiles(values, weights, (0.1, 0.5, 0.9))[:, 0]
+    repeated = np.quantile(np.repeat(values, weights), (0.1, 0.5, 0.9))
+    np.testing.assert_allclose(weighted, repeated, atol=0.01)
+
+
+def test_single_sample_and_shape(curves):
+    np.testing.assert_array_equal(weighted_quantiles(curves[:1], quantiles=(0.1, 0.9)), np.repeat(curves[:1], 2, axis=0))
+    assert weighted_quantiles(curves[:, 0], quantiles=(0.5,)).shape == (1, 1)
+
+
+def test_densities_are_normalized():
+    rng = np.random.default_rng(2)
+    values = np.r_[rng.normal(size=5000), np.nan]
+    edges, density = weighted_histogram(values, np.r_[rng.random(5000), 1.], smooth=1.0)
+    assert np.isclose((density * np.diff(edges)).sum(), 1.0, rtol=0.05)
+    x, y, grid = weighted_density_2d(values[:-1], rng.normal(size=5000), smooth=0.0)
+    assert grid.shape == (50, 50)
+    assert np.isclose(grid.sum() * (x[1] - x[0]) * (y[1] - y[0]), 1.0)
+
+
+def test_credible_levels_hold_their_mass():
+    x = np.linspace(-5, 5, 201)
+    density = np.exp(-0.5 * (x[:, None]**2 + x[None, :]**2))
+    levels = credible_levels(density, (0.68, 0.95))
+    assert levels[0] > levels[1]
+    total = density.sum()
+    for mass, level in zip((0.68, 0.95), levels):
+        assert abs(density[density >= level].sum() / total - mass) < 0.01
+    np.testing.assert_array_equal(credible_levels(np.zeros((3, 3))), [0, 0])
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bsavi.loaders import subsample
+
+
+@pytest.fixture
+def chains():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'weight': rng.integers(1, 5, 1000).astype(float),
+        '-LogLkl': rng.random(1000) * 10,
+        'a': rng.normal(size=1000),
+    })
+
+
+@pytest.mark.parametrize('method', ['multiplicity', 'stratified', 'uniform'])
+def test_draws_n_distinct_rows_in_order(chains, method):
+    drawn = subsample(chains, 100, method=method, keep_best=3, random_state=1)
+    assert len(drawn) == 100
+    assert drawn.index.is_unique and drawn.index.is_monotonic_increasing
+    assert set(chains['-LogLkl'].nsmallest(3).index) <= set(drawn.index)
+
+
+def test_keep_best_is_capped_at_n(chains):
+    drawn = subsample(chains, 5, keep_best=20, random_state=1)
+    assert len(drawn) == 5
+    assert set(drawn.index) <= set(chains['-LogLkl'].nsmallest(20).index)
+
+
+def test_draws_follow_the_weights():
+    data = pd.DataFrame({'weight': [0., 1., 0., 1.], '-LogLkl': [1., 2., 3., 4.]})
+    assert list(subsample(data, 2, random_state=3).index) == [1, 3]
+    weights = np.r_[np.full(100, 1e-6), np.full(100, 1.)]
+    drawn = subsample(pd.DataFrame({'a': np.arange(200)}), 50, weights=weights, random_state=4)
+    assert (drawn.index >= 100).mean() > 0.9
+
+
+def test_reproducible(chains):
+    first = subsample(chains, 50, method='stratified', random_state=7)
+    assert first.index.equals(subsample(chains, 50, method='stratified', random_state=7).index)
+
+
+def test_short_chains_are_returned_whole(chains):
+    assert len(subsample(chains.head(10), 50)) == 10
+
+
+def test_missing_columns(chains):
+    unweighted = chains.drop(columns='weight')
+    with pytest.raises(ValueError):
+        subsample(unweighted, 10)
+    assert len(subsample(unweighted, 10, weights=None)) == 10
+    assert len(subsample(unweighted, 10, method='uniform')) == 10
+    with pytest.raises(ValueError):
+        subsample(chains.drop(columns='-LogLkl'), 10, keep_best=1)
+    with pytest.raises(ValueError):
+        subsample(chains, 10, method='best')